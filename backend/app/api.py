@@ -1,4 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from core.dependencies import cache_policy, require_metrics_token
+from core.metrics import metrics
 from users.api import router as users_router
 from music.api import router as music_router
 
@@ -8,6 +11,11 @@ api_router.include_router(users_router)
 api_router.include_router(music_router)
 
 
-@api_router.get("/healthcheck")
+@api_router.get("/healthcheck", dependencies=[Depends(cache_policy("no-store"))])
 async def healthcheck():
     return {"status": "healthy"}
+
+
+@api_router.get("/metrics", dependencies=[Depends(require_metrics_token), Depends(cache_policy("no-store"))])
+async def get_metrics():
+    return metrics.snapshot()
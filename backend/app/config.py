@@ -15,19 +15,133 @@ class Settings(BaseSettings):
     DATABASE_URL: str
 
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5
+    REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS: float = 2
+    REDIS_HEALTH_CHECK_INTERVAL_SECONDS: int = 30
+    REDIS_CLIENT_CACHE_ENABLED: bool = False
+    REDIS_CLIENT_CACHE_PREFIXES: list[str] = ["dab_session:", "stream:"]
+    REDIS_CLIENT_CACHE_MAX_KEYS: int = 10_000
+    REDIS_CLIENT_CACHE_TTL_SECONDS: float = 60
 
     DAB_API_URL: str
     SECRET_USER_AGENT: str
 
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 50
+    HTTP_DNS_CACHE_TTL_SECONDS: int = 300
+    HTTP_KEEPALIVE_TIMEOUT_SECONDS: float = 60
+    HTTP_TIMEOUT_SECONDS: float = 30
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_READ_TIMEOUT_SECONDS: float = 15
+
+    SEARCH_CACHE_TTL_SECONDS: int = 300
+    SEARCH_CACHE_STALE_TTL_SECONDS: int = 3600
+    SEARCH_CACHE_REFRESH_LOCK_SECONDS: int = 30
+
+    STREAM_CACHE_DEFAULT_TTL_SECONDS: int = 300
+    STREAM_CACHE_SAFETY_MARGIN_SECONDS: int = 30
+    STREAM_CACHE_PER_ACCOUNT: bool = False
+
+    AUDIO_PROXY_READ_BUFSIZE: int = 64 * 1024
+    # аудио отдают сторонние CDN: секретный User-Agent для DAB им не отправляем
+    AUDIO_PROXY_USER_AGENT: str = "Mozilla/5.0"
+
+    SEGMENT_CACHE_ENABLED: bool = False
+    SEGMENT_CACHE_DIR: str = "/tmp/oasis/segments"
+    SEGMENT_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    SEGMENT_CACHE_SEGMENT_BYTES: int = 1024 * 1024
+    SEGMENT_CACHE_INDEX_FLUSH_SECONDS: int = 30
+    SEGMENT_CACHE_FREQUENCY_WEIGHT_SECONDS: int = 3600
+
+    PLAYLIST_POSITION_MAX_LENGTH: int = 32
+    PLAYLIST_BATCH_MAX_TRACKS: int = 1000
+
+    PREFETCH_TRACKS_AHEAD: int = 2
+    PREFETCH_MAX_CONCURRENCY_PER_USER: int = 2
+
+    SINGLEFLIGHT_CLUSTER_ENABLED: bool = False
+    SINGLEFLIGHT_LOCK_TTL_MS: int = 5000
+    SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS: float = 5
+
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    METRICS_TOKEN: str | None = None
+    USER_STATE_CACHE_TTL_SECONDS: int = 30
+    USER_STATE_CACHE_MAX_ENTRIES: int = 10_000
+    USER_STATE_LISTENER_MAX_BACKOFF_SECONDS: float = 30
+
+    DAB_SESSION_RENEW_ENABLED: bool = True
+    DAB_SESSION_RENEW_INTERVAL_SECONDS: int = 300
+    DAB_SESSION_RENEW_BEFORE_SECONDS: int = 12 * 60 * 60
+    DAB_SESSION_RENEW_JITTER_SECONDS: int = 6 * 60 * 60
+    DAB_SESSION_RENEW_BATCH_SIZE: int = 500
+    DAB_SESSION_RENEW_CONCURRENCY: int = 4
+    DAB_SESSION_ACTIVE_WINDOW_SECONDS: int = 3 * 24 * 60 * 60
+    DAB_SESSION_TOUCH_INTERVAL_SECONDS: int = 60
+
+    DAB_LIMITER_INITIAL_LIMIT: int = 20
+    DAB_LIMITER_MIN_LIMIT: int = 2
+    DAB_LIMITER_MAX_LIMIT: int = 200
+    DAB_LIMITER_LATENCY_THRESHOLD_SECONDS: float = 2.0
+    DAB_LIMITER_BACKOFF_RATIO: float = 0.7
+    DAB_LIMITER_DECREASE_COOLDOWN_SECONDS: float = 1.0
+    DAB_LIMITER_QUEUE_TIMEOUT_SECONDS: float = 10
+    DAB_RATE_LIMIT_PER_SECOND: float = 0
+    DAB_RATE_LIMIT_BURST: int = 20
+
+    DAB_REQUEST_TIMEOUT_SECONDS: float = 10
+    DAB_BREAKER_FAILURE_THRESHOLD: int = 5
+    DAB_BREAKER_OPEN_SECONDS: float = 30
+    DAB_HEDGE_ENABLED: bool = False
+    DAB_HEDGE_SAMPLE_SIZE: int = 200
+    DAB_HEDGE_MIN_SAMPLES: int = 20
+    DAB_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    DAB_HEDGE_MAX_RATIO: float = 0.1
+    DAB_HEDGE_MAX_BURST: float = 10
+
+    SEARCH_DEFAULT_MODE: str = "upstream"
+    SEARCH_LOCAL_LIMIT: int = 25
+
+    SEARCH_PAGE_SIZE: int = 30
+    SEARCH_STREAM_PAGES: int = 4
+    SEARCH_STREAM_MAX_PAGES: int = 10
+
+    SUGGEST_MAX_PREFIX_LENGTH: int = 15
+    SUGGEST_MAX_PHRASE_LENGTH: int = 100
+    SUGGEST_MAX_PER_PREFIX: int = 50
+    SUGGEST_HALF_LIFE_SECONDS: int = 7 * 24 * 60 * 60
+    SUGGEST_TTL_SECONDS: int = 30 * 24 * 60 * 60
+
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_ENABLED: bool = True
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_CONTENT_TYPES: list[str] = ["application/json", "application/x-ndjson", "text/"]
+
+    DAB_LOGIN_LOCK_TTL_MS: int = 10_000
+    DAB_LOGIN_WAIT_TIMEOUT_SECONDS: float = 10
+    DAB_LOGIN_POLL_INTERVAL_MS: int = 100
+
+    CRYPTO_WORKERS: int = 4
+    CRYPTO_USE_PROCESS_POOL: bool = False
 
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 465
     SMTP_USER: str
     SMTP_PASSWORD: str
+    SMTP_TIMEOUT_SECONDS: int = 30
+    SMTP_POOL_SIZE: int = 2
+    SMTP_QUEUE_SIZE: int = 1000
+    SMTP_BATCH_SIZE: int = 20
+    SMTP_MAX_RETRIES: int = 3
+    SMTP_RETRY_BACKOFF_SECONDS: float = 1.0
+    SMTP_IDLE_TIMEOUT_SECONDS: int = 60
+    SMTP_DRAIN_TIMEOUT_SECONDS: int = 10
 
 
 settings = Settings()
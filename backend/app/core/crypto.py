@@ -0,0 +1,64 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import settings
+from core import security
+from core.metrics import metrics
+
+
+class CryptoService:
+    def __init__(self):
+        self._executor: Executor | None = None
+        self._limit: asyncio.Semaphore | None = None
+        self._queued = 0
+        self._active = 0
+
+    def start(self):
+        if settings.CRYPTO_USE_PROCESS_POOL:
+            self._executor = ProcessPoolExecutor(max_workers=settings.CRYPTO_WORKERS)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=settings.CRYPTO_WORKERS, thread_name_prefix="crypto")
+        self._limit = asyncio.Semaphore(settings.CRYPTO_WORKERS)
+
+    def stop(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _report(self):
+        metrics.set_gauge("crypto.queued", self._queued)
+        metrics.set_gauge("crypto.active", self._active)
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(settings.CRYPTO_WORKERS)
+
+        queued_at = time.perf_counter()
+        self._queued += 1
+        self._report()
+        try:
+            await self._limit.acquire()
+        finally:
+            self._queued -= 1
+
+        metrics.inc("crypto.calls")
+        metrics.inc("crypto.queue_wait_ms", int((time.perf_counter() - queued_at) * 1000))
+        self._active += 1
+        self._report()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._active -= 1
+            self._limit.release()
+            self._report()
+
+    async def hash_password(self, password: str) -> str:
+        return await self._run(security.hash_password, password)
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(security.verify_password, plain_password, hashed_password)
+
+
+crypto_service = CryptoService()
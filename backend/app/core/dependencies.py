@@ -1,25 +1,50 @@
+import secrets
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi.security import HTTPBearer
 
+from config import settings
 from core.exceptions import InvalidToken
 from core.security import decode_token
 
 security = HTTPBearer()
 
 
-async def get_current_user_id(
+async def get_token_payload(
         credentials: Annotated[str, Depends(security)]
-) -> int:
+) -> dict:
     token = credentials.credentials
     payload = decode_token(token)
 
     if not payload:
         raise InvalidToken("Invalid token")
 
-    user_id = payload.get("sub")
-    if not user_id:
+    if not payload.get("sub"):
         raise InvalidToken("Invalid token payload")
 
-    return int(user_id)
+    return payload
+
+
+async def get_current_user_id(
+        payload: Annotated[dict, Depends(get_token_payload)]
+) -> int:
+    return int(payload["sub"])
+
+
+async def require_metrics_token(
+        credentials: Annotated[str, Depends(security)]
+):
+    # метрики раскрывают внутреннее состояние: без настроенного токена эндпоинт закрыт
+    if not settings.METRICS_TOKEN or not secrets.compare_digest(
+        credentials.credentials.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        raise InvalidToken("Invalid token")
+
+
+def cache_policy(cache_control: str, vary: tuple[str, ...] = ()):
+    async def apply(request: Request):
+        request.state.cache_control = cache_control
+        request.state.vary = vary
+
+    return apply
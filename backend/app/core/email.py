@@ -1,29 +1,129 @@
+import asyncio
 from email.message import EmailMessage
 
 import aiosmtplib
 
 from config import settings
+from core.metrics import metrics
+from core.tasks import spawn
 
 
-async def send_email(to_email: str, subject: str, body: str):
-    if not settings.SMTP_USER or not settings.SMTP_PASSWORD:
-        print("SMTP credentials not set. Email not sent.")
-        return
+class EmailTransport:
+    def __init__(self):
+        self._queue: asyncio.Queue[EmailMessage] | None = None
+        self._workers: list[asyncio.Task] = []
 
-    message = EmailMessage()
-    message["From"] = settings.SMTP_USER
-    message["To"] = to_email
-    message["Subject"] = subject
-    message.set_content(body)
+    @staticmethod
+    def _is_configured() -> bool:
+        return bool(settings.SMTP_USER and settings.SMTP_PASSWORD)
 
-    try:
-        await aiosmtplib.send(
-            message,
+    def _report(self):
+        metrics.set_gauge("email.queued", self._queue.qsize() if self._queue else 0)
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=settings.SMTP_QUEUE_SIZE)
+        if not self._is_configured():
+            print("SMTP credentials not set. Emails will not be sent.")
+            return
+        self._workers = [spawn(self._worker()) for _ in range(settings.SMTP_POOL_SIZE)]
+
+    async def stop(self):
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=settings.SMTP_DRAIN_TIMEOUT_SECONDS)
+            except TimeoutError:
+                print(f"Email queue not drained, {self._queue.qsize()} emails dropped")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, to_email: str, subject: str, body: str):
+        if not self._workers:
+            print("SMTP credentials not set. Email not sent.")
+            return
+
+        message = EmailMessage()
+        message["From"] = settings.SMTP_USER
+        message["To"] = to_email
+        message["Subject"] = subject
+        message.set_content(body)
+
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            metrics.inc("email.dropped")
+            print(f"Email queue is full, email to {to_email} dropped")
+            return
+
+        metrics.inc("email.enqueued")
+        self._report()
+
+    @staticmethod
+    async def _connect() -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
             hostname=settings.SMTP_HOST,
             port=settings.SMTP_PORT,
-            username=settings.SMTP_USER,
-            password=settings.SMTP_PASSWORD,
             use_tls=True,
+            timeout=settings.SMTP_TIMEOUT_SECONDS,
         )
-    except Exception as e:
-        print("failed to send email")
+        await smtp.connect()
+        await smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        metrics.inc("email.connections")
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP | None) -> None:
+        if smtp is None or not smtp.is_connected:
+            return None
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+        return None
+
+    async def _deliver(self, smtp: aiosmtplib.SMTP | None, message: EmailMessage) -> aiosmtplib.SMTP | None:
+        for attempt in range(settings.SMTP_MAX_RETRIES + 1):
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+                metrics.inc("email.sent")
+                return smtp
+            except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused) as e:
+                metrics.inc("email.failed")
+                print(f"Email to {message['To']} rejected: {e}")
+                return smtp
+            except Exception as e:
+                smtp = await self._close(smtp)
+                if attempt == settings.SMTP_MAX_RETRIES:
+                    metrics.inc("email.failed")
+                    print(f"Failed to send email to {message['To']}: {e}")
+                    return None
+                metrics.inc("email.retried")
+                await asyncio.sleep(settings.SMTP_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def _worker(self):
+        smtp: aiosmtplib.SMTP | None = None
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(self._queue.get(), timeout=settings.SMTP_IDLE_TIMEOUT_SECONDS)
+                except TimeoutError:
+                    # сервер всё равно закроет простаивающее соединение, закрываем сами
+                    smtp = await self._close(smtp)
+                    continue
+
+                batch = [first]
+                while len(batch) < settings.SMTP_BATCH_SIZE and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                self._report()
+
+                for message in batch:
+                    smtp = await self._deliver(smtp, message)
+                    self._queue.task_done()
+        finally:
+            await self._close(smtp)
+
+
+email_transport = EmailTransport()
@@ -1,12 +1,14 @@
 import base64
 import hashlib
+from functools import lru_cache
 
 from cryptography.fernet import Fernet
 
 from config import settings
 
 
-def _get_cipher():
+@lru_cache(maxsize=1)
+def _get_cipher() -> Fernet:
     key = hashlib.sha256(settings.SECRET_KEY.encode()).digest()
     key_b64 = base64.urlsafe_b64encode(key)
     return Fernet(key_b64)
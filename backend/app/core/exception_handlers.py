@@ -5,7 +5,7 @@ from core.exceptions import (
     UserAlreadyExists,
     InvalidCredentials,
     TokenExpired,
-    InvalidToken, UpstreamServiceError, UserNotFound
+    InvalidToken, UpstreamServiceError, UserNotFound, UpstreamRateLimited, TrackNotFound
 )
 
 
@@ -23,6 +23,13 @@ async def user_not_found_handler(request: Request, exc: UserNotFound) -> JSONRes
     )
 
 
+async def track_not_found_handler(request: Request, exc: TrackNotFound) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_404_NOT_FOUND,
+        content={"detail": str(exc) or "Track not found"}
+    )
+
+
 async def invalid_auth_handler(request: Request, exc: InvalidCredentials) -> JSONResponse:
     return JSONResponse(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -66,9 +73,18 @@ async def upstream_error_handler(request: Request, exc: UpstreamServiceError) ->
     )
 
 
+async def upstream_rate_limited_handler(request: Request, exc: UpstreamRateLimited) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc) or "Upstream service is rate limiting requests"}
+    )
+
+
 def register_exception_handlers(app: FastAPI):
+    app.add_exception_handler(UpstreamRateLimited, upstream_rate_limited_handler)
     app.add_exception_handler(UpstreamServiceError, upstream_error_handler)
     app.add_exception_handler(UserNotFound, user_not_found_handler)
+    app.add_exception_handler(TrackNotFound, track_not_found_handler)
     app.add_exception_handler(UserAlreadyExists, user_exists_handler)
     app.add_exception_handler(InvalidCredentials, invalid_auth_handler)
     app.add_exception_handler(TokenExpired, token_expired_handler)
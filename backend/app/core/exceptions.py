@@ -10,6 +10,10 @@ class UserNotFound(OasisException):
     pass
 
 
+class TrackNotFound(OasisException):
+    pass
+
+
 class InvalidCredentials(OasisException):
     pass
 
@@ -24,3 +28,15 @@ class InvalidToken(OasisException):
 
 class UpstreamServiceError(OasisException):
     pass
+
+
+class UpstreamRateLimited(UpstreamServiceError):
+    pass
+
+
+class UpstreamUnavailable(UpstreamServiceError):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
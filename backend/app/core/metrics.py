@@ -0,0 +1,22 @@
+from collections import Counter
+
+
+class Metrics:
+    def __init__(self):
+        self._counters: Counter[str] = Counter()
+        self._gauges: dict[str, float] = {}
+
+    def inc(self, name: str, value: int = 1):
+        self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        self._gauges[name] = value
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+        }
+
+
+metrics = Metrics()
@@ -0,0 +1,147 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from core.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+UNCOMPRESSIBLE_STATUSES = (204, 206, 304)
+
+
+def _choose_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip()] = quality
+
+    candidates = ("br", "gzip") if brotli and settings.COMPRESSION_BROTLI_ENABLED else ("gzip",)
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _is_compressible_type(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return any(
+        media_type.startswith(allowed) if allowed.endswith("/") else media_type == allowed
+        for allowed in settings.COMPRESSION_CONTENT_TYPES
+    )
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY) if encoding == "br" else None
+        self._zlib = None if self._brotli else zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        # sync flush после каждого чанка, чтобы потоковые ответы (NDJSON) не застревали в буфере
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _CompressionResponder:
+    def __init__(self, scope: Scope, send: Send, encoding: str | None):
+        self.scope = scope
+        self.send = send
+        self.encoding = encoding
+        self.start_message: Message | None = None
+        self.compressor: _Compressor | None = None
+
+    def _apply_cache_policy(self, message: Message, headers: MutableHeaders):
+        state = self.scope.get("state") or {}
+        cache_control = state.get("cache_control")
+        if cache_control is None or message["status"] >= 400:
+            return
+        if "cache-control" not in headers:
+            headers["Cache-Control"] = cache_control
+        for name in state.get("vary", ()):
+            headers.add_vary_header(name)
+
+    def _should_compress(self, message: Message, headers: MutableHeaders) -> bool:
+        if message["status"] in UNCOMPRESSIBLE_STATUSES or message["status"] < 200:
+            return False
+        if "content-encoding" in headers or not _is_compressible_type(headers.get("content-type", "")):
+            return False
+
+        headers.add_vary_header("Accept-Encoding")
+        if self.encoding is None:
+            return False
+        content_length = headers.get("content-length")
+        return content_length is None or int(content_length) >= settings.COMPRESSION_MIN_SIZE
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(scope=message)
+            self._apply_cache_policy(message, headers)
+            if self._should_compress(message, headers):
+                self.start_message = message
+            else:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or (self.start_message is None and self.compressor is None):
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            start_message, self.start_message = self.start_message, None
+            if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = self.encoding
+            # сжатое представление побайтно отличается от исходного, поэтому strong ETag становится weak
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            del headers["content-length"]
+
+            data = self.compressor.compress(body, final=not more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(data))
+            metrics.inc(f"compression.{self.encoding}")
+            await self.send(start_message)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        data = self.compressor.compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        if settings.COMPRESSION_ENABLED and scope["method"] != "HEAD":
+            encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await self.app(scope, receive, _CompressionResponder(scope, send, encoding))
@@ -33,7 +33,7 @@ def create_token(
     else:
         expire = datetime.now(UTC) + timedelta(minutes=15)
 
-    to_encode.update({"exp": expire, "type": token_type})
+    to_encode.update({"exp": expire, "iat": datetime.now(UTC), "type": token_type})
     encoded_jwt = jwt.encode(
         to_encode,
         settings.SECRET_KEY,
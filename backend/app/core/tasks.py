@@ -0,0 +1,17 @@
+import asyncio
+from typing import Coroutine
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        print(f"Background task failed: {task.exception()}")
+
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
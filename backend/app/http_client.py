@@ -0,0 +1,41 @@
+import aiohttp
+
+from config import settings
+
+
+class HttpClient:
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+
+    async def connect(self):
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL_SECONDS,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT_SECONDS,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TIMEOUT_SECONDS,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            sock_read=settings.HTTP_READ_TIMEOUT_SECONDS,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            headers={"User-Agent": settings.SECRET_USER_AGENT},
+        )
+
+    async def disconnect(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if not self._session or self._session.closed:
+            raise Exception("HTTP client not connected")
+        return self._session
+
+
+http_client = HttpClient()
@@ -5,14 +5,33 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api import api_router
+from core.crypto import crypto_service
+from core.email import email_transport
 from core.exception_handlers import register_exception_handlers
+from core.middleware import CompressionMiddleware
+from http_client import http_client
+from music.segment_cache import segment_cache
+from music.session import dab_session_manager
 from redis_client import redis_client
+from users.state import user_state_cache
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await redis_client.connect()
+    await http_client.connect()
+    crypto_service.start()
+    await segment_cache.open()
+    user_state_cache.start()
+    dab_session_manager.start()
+    email_transport.start()
     yield
+    await email_transport.stop()
+    dab_session_manager.stop()
+    user_state_cache.stop()
+    await segment_cache.close()
+    crypto_service.stop()
+    await http_client.disconnect()
     await redis_client.disconnect()
 
 
@@ -25,6 +44,7 @@ app = FastAPI(
 
 register_exception_handlers(app)
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,61 @@
+"""add track search index
+
+Revision ID: 630779271148
+Revises: b83d0e6f51a2
+Create Date: 2026-10-18 21:14:03.552187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '630779271148'
+down_revision: Union[str, Sequence[str], None] = 'b83d0e6f51a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('tracks', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(artist, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(album, '')), 'C')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.add_column('tracks', sa.Column(
+        'search_text',
+        sa.String(),
+        sa.Computed(
+            "lower(coalesce(title, '') || ' ' || coalesce(artist, '') || ' ' || coalesce(album, ''))",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_tracks_search_vector', 'tracks', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index(
+        'ix_tracks_search_text_trgm',
+        'tracks',
+        ['search_text'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'search_text': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tracks_search_text_trgm', table_name='tracks')
+    op.drop_index('ix_tracks_search_vector', table_name='tracks')
+    op.drop_column('tracks', 'search_text')
+    op.drop_column('tracks', 'search_vector')
@@ -0,0 +1,72 @@
+"""add position to playlist_tracks
+
+Revision ID: b83d0e6f51a2
+Revises: 4f1c2a7b9d3e
+Create Date: 2026-10-18 19:48:37.102945
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d0e6f51a2'
+down_revision: Union[str, Sequence[str], None] = '4f1c2a7b9d3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def _next_key(key: str) -> str:
+    # same integer keys as music.ranking.n_keys_between(None, None, n): a0, a1, ..., az, b00, ...
+    head, digits = key[0], list(key[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[0]
+    return chr(ord(head) + 1) + "".join(digits) + DIGITS[0]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('playlist_tracks', sa.Column('position', sa.String(collation='C'), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT playlist_id, track_id FROM playlist_tracks ORDER BY playlist_id, track_id"
+    )).all()
+
+    updates = []
+    current_playlist, key = None, None
+    for playlist_id, track_id in rows:
+        key = "a0" if playlist_id != current_playlist else _next_key(key)
+        current_playlist = playlist_id
+        updates.append({"playlist_id": playlist_id, "track_id": track_id, "position": key})
+
+    if updates:
+        conn.execute(
+            sa.text(
+                "UPDATE playlist_tracks SET position = :position "
+                "WHERE playlist_id = :playlist_id AND track_id = :track_id"
+            ),
+            updates
+        )
+
+    op.alter_column('playlist_tracks', 'position', nullable=False)
+    op.create_index(
+        'ix_playlist_tracks_playlist_id_position',
+        'playlist_tracks',
+        ['playlist_id', 'position'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_playlist_tracks_playlist_id_position', table_name='playlist_tracks')
+    op.drop_column('playlist_tracks', 'position')
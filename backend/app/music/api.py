@@ -1,50 +1,170 @@
+import json
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Query, Path, status
+from fastapi import APIRouter, Body, Depends, Query, Path, Request, status
+from fastapi.responses import Response, StreamingResponse
 
+from config import settings
+from core.dependencies import cache_policy
+from core.exceptions import TrackNotFound
+from core.tasks import spawn
 from music.dependencies import get_music_service
-from music.schemas import TrackBase, PlaylistResponse, PlaylistCreate
+from music.encoding import MsgspecResponse, playlist_out
+from music.proxy import AudioProxy
+from music.segment_cache import segment_cache
+from music.schemas import TrackBase, PlaylistResponse, PlaylistCreate, NowPlaying, PlaylistSummaryPage, TrackMove, \
+    SearchMode
 from music.service import MusicService
+from music.suggest import SuggestIndex
+from users.dependencies import get_current_principal, Principal
 
-router = APIRouter(prefix="/music", tags=["Music"])
+router = APIRouter(prefix="/music", tags=["Music"], default_response_class=MsgspecResponse)
 
+# выдача поиска общая для всех, но эндпоинты авторизованы, поэтому кэш только private
+search_cache_policy = Depends(cache_policy(
+    f"private, max-age={settings.SEARCH_CACHE_TTL_SECONDS}, stale-while-revalidate={settings.SEARCH_CACHE_STALE_TTL_SECONDS}",
+    vary=("Authorization",)
+))
+# плейлисты всегда ревалидируются через ETag библиотеки
+playlists_cache_policy = Depends(cache_policy("private, no-cache", vary=("Authorization",)))
 
-@router.get("/search")
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # сравнение слабое: при сжатии middleware отдаёт ETag как W/"..."
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+@router.get("/search", dependencies=[search_cache_policy])
 async def search_tracks(
         query: Annotated[str, Query(min_length=1)],
         offset: Annotated[int, Query(ge=0)] = 0,
+        mode: Annotated[SearchMode | None, Query()] = None,
         service: Annotated[MusicService, Depends(get_music_service)] = None,
 ):
-    return await service.search_tracks(query=query, offset=offset)
+    return MsgspecResponse(await service.search_tracks(query=query, offset=offset, mode=mode))
+
+
+@router.get("/search/stream", dependencies=[Depends(cache_policy("no-store"))])
+async def stream_search(
+        query: Annotated[str, Query(min_length=1)],
+        offset: Annotated[int, Query(ge=0)] = 0,
+        pages: Annotated[int, Query(ge=1, le=settings.SEARCH_STREAM_MAX_PAGES)] = settings.SEARCH_STREAM_PAGES,
+        service: Annotated[MusicService, Depends(get_music_service)] = None,
+):
+    async def lines():
+        async for page in service.stream_search(query=query, offset=offset, pages=pages):
+            yield json.dumps(page, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/suggest", response_model=list[str], dependencies=[search_cache_policy])
+async def suggest(
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        principal: Annotated[Principal, Depends(get_current_principal)],
+        limit: Annotated[int, Query(ge=1, le=20)] = 10,
+):
+    return await SuggestIndex.suggest(q, limit)
 
 
 @router.get("/stream/{track_id}")
 async def stream_track(
+        track_id: Annotated[int, Path(gt=0)],
+        playlist_id: Annotated[int | None, Query()] = None,
+        service: Annotated[MusicService, Depends(get_music_service)] = None,
+):
+    stream = await service.stream_track(track_id=track_id)
+    if playlist_id is not None:
+        spawn(service.prefetch_upcoming(playlist_id, track_id))
+    return stream
+
+
+@router.post("/now-playing", status_code=status.HTTP_202_ACCEPTED)
+async def now_playing(
+        data: NowPlaying,
+        service: Annotated[MusicService, Depends(get_music_service)]
+):
+    spawn(service.prefetch_upcoming(data.playlist_id, data.track_id))
+
+
+@router.get("/stream/{track_id}/audio")
+@router.head("/stream/{track_id}/audio")
+async def stream_audio(
+        track_id: Annotated[int, Path(gt=0)],
+        request: Request,
+        playlist_id: Annotated[int | None, Query()] = None,
+        service: Annotated[MusicService, Depends(get_music_service)] = None,
+):
+    if playlist_id is not None and request.method == "GET":
+        spawn(service.prefetch_upcoming(playlist_id, track_id))
+
+    if segment_cache.enabled:
+        response = await segment_cache.serve(
+            track_id,
+            request.headers,
+            request.method,
+            lambda start, end: service.open_audio_range(track_id, start, end),
+        )
+        if response is not None:
+            return response
+
+    upstream = await service.open_audio(track_id, request.headers, request.method)
+    return AudioProxy.build_response(upstream, request.method)
+
+
+@router.delete("/stream/{track_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def invalidate_stream(
         track_id: Annotated[int, Path(gt=0)],
         service: Annotated[MusicService, Depends(get_music_service)] = None,
 ):
-    return await service.stream_track(track_id=track_id)
+    await service.invalidate_stream(track_id=track_id)
 
 
-@router.get("/playlists", response_model=list[PlaylistResponse])
+@router.get("/playlists", response_model=list[PlaylistResponse], dependencies=[playlists_cache_policy])
 async def get_playlists(
+        request: Request,
         service: Annotated[MusicService, Depends(get_music_service)]
 ):
+    # версию читаем до запроса в БД: запись, закоммиченная между ними, лишь сделает ETag устаревшим
+    etag = f'"{await service.get_library_version()}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
     playlists = await service.get_playlists()
-    response = []
-    for p in playlists:
-        tracks = [
-            TrackBase(
-                id=int(t.source_id),
-                title=t.title,
-                artist=t.artist,
-                album=t.album,
-                album_cover=t.album_cover,
-                duration=t.duration
-            ) for t in p.tracks
-        ]
-        response.append(PlaylistResponse(id=p.id, name=p.name, cover_image=p.cover_image, tracks=tracks))
-    return response
+    return MsgspecResponse([playlist_out(p) for p in playlists], headers={"ETag": etag})
+
+
+@router.get("/playlists/summary", response_model=PlaylistSummaryPage, dependencies=[playlists_cache_policy])
+async def get_playlist_summaries(
+        request: Request,
+        limit: Annotated[int, Query(ge=1, le=200)] = 50,
+        after: Annotated[int | None, Query(ge=0)] = None,
+        service: Annotated[MusicService, Depends(get_music_service)] = None,
+):
+    etag = f'"{await service.get_library_version()}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    items = await service.get_playlist_summaries(limit=limit, after=after)
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return MsgspecResponse({"items": items, "next_cursor": next_cursor}, headers={"ETag": etag})
+
+
+@router.get("/playlists/{playlist_id}", response_model=PlaylistResponse | None, dependencies=[playlists_cache_policy])
+async def get_playlist(
+        request: Request,
+        playlist_id: int,
+        service: Annotated[MusicService, Depends(get_music_service)]
+):
+    etag = f'"{await service.get_library_version()}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    playlist = await service.get_playlist(playlist_id)
+    return MsgspecResponse(playlist_out(playlist) if playlist else None, headers={"ETag": etag})
 
 
 @router.post("/playlists", response_model=PlaylistResponse, status_code=status.HTTP_201_CREATED)
@@ -63,19 +183,46 @@ async def delete_playlist(
     await service.delete_playlist(playlist_id)
 
 
-@router.post("/playlists/{playlist_id}/tracks")
+@router.post("/playlists/{playlist_id}/tracks", response_model=PlaylistResponse | None)
 async def add_track(
         playlist_id: int,
         track: TrackBase,
-        service: Annotated[MusicService, Depends(get_music_service)]
+        service: Annotated[MusicService, Depends(get_music_service)],
+        after_id: Annotated[int | None, Query()] = None,
+        before_id: Annotated[int | None, Query()] = None,
+):
+    playlist = await service.add_track_to_playlist(playlist_id, track, after_id, before_id)
+    return MsgspecResponse(playlist_out(playlist) if playlist else None)
+
+
+@router.post("/playlists/{playlist_id}/tracks:batch", response_model=PlaylistResponse | None)
+async def add_tracks(
+        playlist_id: int,
+        tracks: Annotated[list[TrackBase], Body(max_length=settings.PLAYLIST_BATCH_MAX_TRACKS)],
+        service: Annotated[MusicService, Depends(get_music_service)],
+        after_id: Annotated[int | None, Query()] = None,
+        before_id: Annotated[int | None, Query()] = None,
 ):
-    return await service.add_track_to_playlist(playlist_id, track)
+    playlist = await service.add_tracks_to_playlist(playlist_id, tracks, after_id, before_id)
+    return MsgspecResponse(playlist_out(playlist) if playlist else None)
 
 
-@router.delete("/playlists/{playlist_id}/tracks/{track_id}")
+@router.delete("/playlists/{playlist_id}/tracks/{track_id}", response_model=PlaylistResponse | None)
 async def remove_track(
         playlist_id: int,
         track_id: int,
         service: Annotated[MusicService, Depends(get_music_service)]
 ):
-    return await service.remove_track_from_playlist(playlist_id, str(track_id))
+    playlist = await service.remove_track_from_playlist(playlist_id, str(track_id))
+    return MsgspecResponse(playlist_out(playlist) if playlist else None)
+
+
+@router.patch("/playlists/{playlist_id}/tracks/{track_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def move_track(
+        playlist_id: int,
+        track_id: int,
+        data: TrackMove,
+        service: Annotated[MusicService, Depends(get_music_service)]
+):
+    if not await service.move_track_in_playlist(playlist_id, str(track_id), data.after_id, data.before_id):
+        raise TrackNotFound("Track is not in this playlist")
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import time
+import unicodedata
+from datetime import datetime, UTC
+from urllib.parse import urlsplit, parse_qsl
+
+from config import settings
+from core.metrics import metrics
+from music.proxy import get_stream_url
+from redis_client import redis_client
+
+
+class SearchCache:
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        query = unicodedata.normalize("NFKC", query).casefold()
+        return " ".join(query.split())
+
+    @staticmethod
+    def _get_cache_key(normalized_query: str, offset: int) -> str:
+        digest = hashlib.sha256(normalized_query.encode()).hexdigest()[:32]
+        return f"search:{offset}:{digest}"
+
+    @staticmethod
+    async def get(normalized_query: str, offset: int) -> tuple[list[dict] | None, bool]:
+        cache_key = SearchCache._get_cache_key(normalized_query, offset)
+        cached = await redis_client.get(cache_key)
+
+        if cached is None:
+            metrics.inc("search_cache.miss")
+            return None, False
+
+        entry = json.loads(cached)
+        is_stale = time.time() - entry["t"] > settings.SEARCH_CACHE_TTL_SECONDS
+        metrics.inc("search_cache.stale" if is_stale else "search_cache.hit")
+        return entry["v"], is_stale
+
+    @staticmethod
+    async def get_many(normalized_query: str, offsets: list[int]) -> dict[int, tuple[list[dict], bool]]:
+        cache_keys = [SearchCache._get_cache_key(normalized_query, offset) for offset in offsets]
+        cached = await redis_client.mget(cache_keys)
+
+        pages = {}
+        for offset, value in zip(offsets, cached):
+            if value is None:
+                metrics.inc("search_cache.miss")
+                continue
+            entry = json.loads(value)
+            is_stale = time.time() - entry["t"] > settings.SEARCH_CACHE_TTL_SECONDS
+            metrics.inc("search_cache.stale" if is_stale else "search_cache.hit")
+            pages[offset] = (entry["v"], is_stale)
+        return pages
+
+    @staticmethod
+    async def set(normalized_query: str, offset: int, tracks: list[dict]):
+        cache_key = SearchCache._get_cache_key(normalized_query, offset)
+        entry = json.dumps({"t": time.time(), "v": tracks}, separators=(",", ":"))
+        await redis_client.set(
+            cache_key,
+            entry,
+            ex=settings.SEARCH_CACHE_TTL_SECONDS + settings.SEARCH_CACHE_STALE_TTL_SECONDS
+        )
+
+    @staticmethod
+    async def acquire_refresh(normalized_query: str, offset: int) -> bool:
+        cache_key = SearchCache._get_cache_key(normalized_query, offset)
+        return await redis_client.set(
+            f"{cache_key}:refresh",
+            "1",
+            ex=settings.SEARCH_CACHE_REFRESH_LOCK_SECONDS,
+            nx=True
+        )
+
+
+def _parse_signed_url_expiry(url: str) -> float | None:
+    params = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+
+    for prefix in ("x-amz", "x-goog"):
+        signed_at, expires_in = params.get(f"{prefix}-date"), params.get(f"{prefix}-expires")
+        if signed_at and expires_in and expires_in.isdigit():
+            try:
+                signed = datetime.strptime(signed_at, "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC)
+            except ValueError:
+                continue
+            return signed.timestamp() + int(expires_in)
+
+    token = params.get("hdnts") or params.get("__token__")
+    if token:
+        for field in token.split("~"):
+            name, _, value = field.partition("=")
+            if name == "exp" and value.isdigit():
+                return float(value)
+
+    for name in ("expires", "exp", "e"):
+        value = params.get(name)
+        if value and value.isdigit() and int(value) > 1_000_000_000:
+            return float(value)
+
+    return None
+
+
+class StreamCache:
+    @staticmethod
+    def _get_cache_key(track_id: int, user_id: int | None) -> str:
+        if user_id is None:
+            return f"stream:{track_id}"
+        return f"stream:{track_id}:{user_id}"
+
+    @staticmethod
+    def _get_ttl(stream: dict) -> int:
+        url = get_stream_url(stream)
+        if not url:
+            return 0
+
+        expires_at = _parse_signed_url_expiry(url)
+        if expires_at is None:
+            return settings.STREAM_CACHE_DEFAULT_TTL_SECONDS
+
+        return int(expires_at - time.time()) - settings.STREAM_CACHE_SAFETY_MARGIN_SECONDS
+
+    @staticmethod
+    async def get(track_id: int, user_id: int | None) -> dict | None:
+        cache_key = StreamCache._get_cache_key(track_id, user_id)
+        cached = await redis_client.get(cache_key)
+
+        if cached is None:
+            metrics.inc("stream_cache.miss")
+            return None
+
+        metrics.inc("stream_cache.hit")
+        return json.loads(cached)
+
+    @staticmethod
+    async def get_many(track_ids: list[int], user_id: int | None) -> dict[int, dict]:
+        cache_keys = [StreamCache._get_cache_key(track_id, user_id) for track_id in track_ids]
+        cached = await redis_client.mget(cache_keys)
+
+        streams = {
+            track_id: json.loads(value)
+            for track_id, value in zip(track_ids, cached)
+            if value is not None
+        }
+        metrics.inc("stream_cache.hit", len(streams))
+        metrics.inc("stream_cache.miss", len(track_ids) - len(streams))
+        return streams
+
+    @staticmethod
+    async def set(track_id: int, user_id: int | None, stream: dict):
+        ttl = StreamCache._get_ttl(stream)
+        if ttl <= 0:
+            return
+
+        cache_key = StreamCache._get_cache_key(track_id, user_id)
+        await redis_client.set(cache_key, json.dumps(stream, separators=(",", ":")), ex=ttl)
+
+    @staticmethod
+    async def invalidate(track_id: int, user_id: int | None):
+        metrics.inc("stream_cache.invalidate")
+        cache_key = StreamCache._get_cache_key(track_id, user_id)
+        await redis_client.delete(cache_key)
+
+
+class LibraryVersion:
+    @staticmethod
+    def _get_cache_key(user_id: int) -> str:
+        return f"library_version:{user_id}"
+
+    @staticmethod
+    async def get(user_id: int) -> int:
+        cache_key = LibraryVersion._get_cache_key(user_id)
+        version = await redis_client.get(cache_key)
+        if version is None:
+            # после потери ключа начинаем с time_ns, чтобы не повторить уже выданную версию
+            await redis_client.set(cache_key, str(time.time_ns()), nx=True)
+            version = await redis_client.get(cache_key)
+        return int(version)
+
+    @staticmethod
+    async def bump(user_id: int):
+        cache_key = LibraryVersion._get_cache_key(user_id)
+        async with redis_client.pipeline() as pipe:
+            pipe.set(cache_key, str(time.time_ns()), nx=True)
+            pipe.incr(cache_key)
+            await pipe.execute()
@@ -0,0 +1,38 @@
+from typing import Any
+
+import msgspec
+from fastapi.responses import Response
+
+
+class TrackOut(msgspec.Struct):
+    id: int
+    title: str
+    artist: str
+    album: str | None = None
+    album_cover: str | None = None
+    duration: int = 0
+
+
+class PlaylistOut(msgspec.Struct):
+    id: int
+    name: str
+    cover_image: str | None = None
+    tracks: list[TrackOut] = []
+
+
+_encoder = msgspec.json.Encoder()
+
+
+class MsgspecResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _encoder.encode(content)
+
+
+def playlist_out(playlist) -> PlaylistOut:
+    tracks = [
+        TrackOut(int(t.source_id), t.title, t.artist, t.album, t.album_cover, t.duration)
+        for t in playlist.tracks
+    ]
+    return PlaylistOut(playlist.id, playlist.name, playlist.cover_image, tracks)
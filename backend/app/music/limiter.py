@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from config import settings
+from core.exceptions import CircuitOpen, UpstreamRateLimited, UpstreamServiceError, UpstreamUnavailable
+from core.metrics import metrics
+from music.repository import MusicRepository
+from redis_client import redis_client
+
+T = TypeVar("T")
+
+PRIORITIES = {"stream": 0, "search": 1, "auth": 2}
+
+# общий для кластера token bucket; возвращает, сколько миллисекунд ждать токен
+TOKEN_BUCKET_SCRIPT = redis_client.register_script("""
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+if tokens < 1 then
+    return math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return 0
+""")
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str):
+        self.name = name
+        self._limit = float(settings.DAB_LIMITER_INITIAL_LIMIT)
+        self._inflight = 0
+        self._queued = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return max(int(self._limit), 1)
+
+    def _report(self):
+        metrics.set_gauge(f"limiter.{self.name}.limit", self.limit)
+        metrics.set_gauge(f"limiter.{self.name}.inflight", self._inflight)
+        metrics.set_gauge(f"limiter.{self.name}.queued", self._queued)
+
+    def _wake(self):
+        while self._waiters and self._inflight < self.limit:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self._inflight += 1
+            waiter.set_result(None)
+
+    async def _acquire(self, request_class: str):
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            self._report()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[request_class], next(self._order), waiter))
+        self._queued += 1
+        self._report()
+        try:
+            async with asyncio.timeout(settings.DAB_LIMITER_QUEUE_TIMEOUT_SECONDS):
+                await waiter
+        except TimeoutError:
+            # слот выдали в той же итерации, где сработал таймаут: он уже наш, используем его
+            if waiter.done() and not waiter.cancelled():
+                return
+            metrics.inc(f"limiter.{self.name}.rejected")
+            raise UpstreamServiceError("Upstream is overloaded, try again later")
+        except asyncio.CancelledError:
+            # слот успели выдать, но запрос отменили
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            self._queued -= 1
+            self._report()
+
+    def _release(self):
+        self._inflight -= 1
+        self._wake()
+        self._report()
+
+    def _adjust(self, latency: float, overloaded: bool):
+        now = time.monotonic()
+        if overloaded or latency > settings.DAB_LIMITER_LATENCY_THRESHOLD_SECONDS:
+            # мультипликативное снижение не чаще раза за период, иначе одна волна медленных ответов обнулит лимит
+            if now - self._last_decrease >= settings.DAB_LIMITER_DECREASE_COOLDOWN_SECONDS:
+                self._last_decrease = now
+                self._limit = max(float(settings.DAB_LIMITER_MIN_LIMIT), self._limit * settings.DAB_LIMITER_BACKOFF_RATIO)
+                metrics.inc(f"limiter.{self.name}.decrease")
+        elif self._inflight >= self.limit:
+            self._limit = min(float(settings.DAB_LIMITER_MAX_LIMIT), self._limit + 1 / self._limit)
+
+    async def _take_token(self):
+        if settings.DAB_RATE_LIMIT_PER_SECOND <= 0:
+            return
+        while True:
+            try:
+                wait_ms = await TOKEN_BUCKET_SCRIPT(
+                    [f"rate_limit:{self.name}"],
+                    [settings.DAB_RATE_LIMIT_PER_SECOND, settings.DAB_RATE_LIMIT_BURST, int(time.time() * 1000)]
+                )
+            except Exception as e:
+                print(f"Rate limit bucket unavailable: {e}")
+                return
+            if not wait_ms:
+                return
+            metrics.inc(f"limiter.{self.name}.throttled_ms", wait_ms)
+            await asyncio.sleep(wait_ms / 1000)
+
+    async def run(self, request_class: str, call: Callable[[], Awaitable[T]]) -> T:
+        await self._acquire(request_class)
+        overloaded = False
+        started = None
+        try:
+            await self._take_token()
+            started = time.monotonic()
+            return await call()
+        except CircuitOpen:
+            # отказ разомкнутого предохранителя мгновенный и ничего не говорит о задержке DAB
+            started = None
+            raise
+        except (UpstreamRateLimited, UpstreamUnavailable, TimeoutError):
+            overloaded = True
+            raise
+        finally:
+            if started is not None:
+                self._adjust(time.monotonic() - started, overloaded)
+            self._release()
+
+
+class LimitedRepository(MusicRepository):
+    def __init__(self, repository: MusicRepository, limiter: AdaptiveLimiter):
+        self._repository = repository
+        self._limiter = limiter
+
+    async def search_tracks(self, query: str, offset: int) -> list[dict]:
+        return await self._limiter.run("search", lambda: self._repository.search_tracks(query, offset))
+
+    async def stream_track(self, track_id: int) -> dict:
+        return await self._limiter.run("stream", lambda: self._repository.stream_track(track_id))
+
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    if name not in _limiters:
+        _limiters[name] = AdaptiveLimiter(name)
+    return _limiters[name]
+
+
+dab_limiter = get_limiter("dab")
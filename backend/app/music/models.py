@@ -1,4 +1,5 @@
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from database import Base
@@ -6,13 +7,26 @@ from database import Base
 
 class PlaylistTrackAssociation(Base):
     __tablename__ = "playlist_tracks"
+    __table_args__ = (
+        Index("ix_playlist_tracks_playlist_id_position", "playlist_id", "position"),
+    )
 
     playlist_id: Mapped[int] = mapped_column(ForeignKey("playlists.id", ondelete="CASCADE"), primary_key=True)
     track_id: Mapped[int] = mapped_column(ForeignKey("tracks.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[str] = mapped_column(String(collation="C"))  # дробный ранг, см. music/ranking.py
 
 
 class Track(Base):
     __tablename__ = "tracks"
+    __table_args__ = (
+        Index("ix_tracks_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_tracks_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"}
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     source_id: Mapped[str] = mapped_column(String, index=True, unique=True)  # ID трека из внешнего API (DAB)
@@ -21,16 +35,49 @@ class Track(Base):
     album: Mapped[str] = mapped_column(String, nullable=True)
     album_cover: Mapped[str] = mapped_column(String, nullable=True)
     duration: Mapped[int] = mapped_column(Integer, default=0)
+    # поисковые колонки вычисляет Postgres, см. MusicService._search_local
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(artist, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(album, '')), 'C')",
+            persisted=True
+        ),
+        nullable=True,
+        deferred=True,
+        deferred_raiseload=True
+    )
+    search_text: Mapped[str] = mapped_column(
+        String,
+        Computed(
+            "lower(coalesce(title, '') || ' ' || coalesce(artist, '') || ' ' || coalesce(album, ''))",
+            persisted=True
+        ),
+        nullable=True,
+        deferred=True,
+        deferred_raiseload=True
+    )
 
-    playlists = relationship("Playlist", secondary="playlist_tracks", back_populates="tracks")
+    playlists = relationship("Playlist", secondary="playlist_tracks", back_populates="tracks", lazy="raise")
 
 
 class Playlist(Base):
     __tablename__ = "playlists"
+    __table_args__ = (
+        Index("ix_playlists_user_id_id", "user_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     name: Mapped[str] = mapped_column(String, unique=True)
     cover_image: Mapped[str] = mapped_column(String, nullable=True)
 
-    tracks = relationship("Track", secondary="playlist_tracks", back_populates="playlists", lazy="selectin")
+    tracks = relationship(
+        "Track",
+        secondary="playlist_tracks",
+        back_populates="playlists",
+        order_by="[PlaylistTrackAssociation.position, PlaylistTrackAssociation.track_id]",
+        lazy="raise",
+        passive_deletes=True
+    )
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from config import settings
+from core.metrics import metrics
+from core.tasks import spawn
+
+
+class StreamPrefetcher:
+    def __init__(self):
+        self._tasks: dict[int, dict[int, asyncio.Task]] = {}
+        self._limits: dict[int, asyncio.Semaphore] = {}
+
+    def schedule(self, user_id: int, track_ids: list[int], resolve: Callable[[int], Awaitable]):
+        tasks = self._tasks.setdefault(user_id, {})
+
+        for track_id in list(tasks):
+            if track_id not in track_ids:
+                tasks.pop(track_id).cancel()
+                metrics.inc("prefetch.cancelled")
+
+        limit = self._limits.setdefault(
+            user_id,
+            asyncio.Semaphore(settings.PREFETCH_MAX_CONCURRENCY_PER_USER)
+        )
+        for track_id in track_ids:
+            if track_id not in tasks:
+                tasks[track_id] = spawn(self._prefetch(user_id, track_id, limit, resolve))
+                metrics.inc("prefetch.scheduled")
+
+        self._cleanup(user_id)
+
+    async def _prefetch(
+            self,
+            user_id: int,
+            track_id: int,
+            limit: asyncio.Semaphore,
+            resolve: Callable[[int], Awaitable],
+    ):
+        try:
+            async with limit:
+                await resolve(track_id)
+            metrics.inc("prefetch.resolved")
+        finally:
+            tasks = self._tasks.get(user_id)
+            if tasks and tasks.get(track_id) is asyncio.current_task():
+                del tasks[track_id]
+            self._cleanup(user_id)
+
+    def _cleanup(self, user_id: int):
+        if not self._tasks.get(user_id):
+            self._tasks.pop(user_id, None)
+            self._limits.pop(user_id, None)
+
+
+stream_prefetcher = StreamPrefetcher()
@@ -0,0 +1,101 @@
+from typing import AsyncIterator
+
+import aiohttp
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from config import settings
+from core.exceptions import UpstreamServiceError
+from core.metrics import metrics
+from http_client import http_client
+
+FORWARDED_REQUEST_HEADERS = ("range", "if-range")
+PASSTHROUGH_RESPONSE_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+)
+EXPIRED_URL_STATUSES = (401, 403, 404, 410)
+
+
+def get_stream_url(stream: dict) -> str | None:
+    return stream.get("url") or stream.get("streamUrl")
+
+
+def _if_range_matches(if_range: str, upstream: aiohttp.ClientResponse) -> bool:
+    if if_range.startswith(("\"", "W/")):
+        return not if_range.startswith("W/") and upstream.headers.get("etag") == if_range
+    return upstream.headers.get("last-modified") == if_range
+
+
+class AudioProxy:
+    @staticmethod
+    async def open(url: str, request_headers: dict, method: str) -> aiohttp.ClientResponse:
+        headers = {
+            name: request_headers[name]
+            for name in FORWARDED_REQUEST_HEADERS
+            if name in request_headers
+        }
+        upstream = await AudioProxy._request(url, headers, method)
+
+        if_range = headers.get("if-range")
+        if upstream.status == 206 and if_range and not _if_range_matches(if_range, upstream):
+            upstream.release()
+            upstream = await AudioProxy._request(url, {}, method)
+
+        return upstream
+
+    @staticmethod
+    async def _request(url: str, headers: dict, method: str) -> aiohttp.ClientResponse:
+        headers = {**headers, "Accept-Encoding": "identity", "User-Agent": settings.AUDIO_PROXY_USER_AGENT}
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            sock_read=settings.HTTP_READ_TIMEOUT_SECONDS,
+        )
+
+        try:
+            return await http_client.session.request(
+                method,
+                url,
+                headers=headers,
+                timeout=timeout,
+                read_bufsize=settings.AUDIO_PROXY_READ_BUFSIZE,
+                auto_decompress=False,
+            )
+        except aiohttp.ClientError as e:
+            raise UpstreamServiceError(f"Audio connection failed: {str(e)}")
+
+    @staticmethod
+    async def _relay(upstream: aiohttp.ClientResponse) -> AsyncIterator[bytes]:
+        metrics.inc("audio_proxy.streams")
+        try:
+            async for chunk in upstream.content.iter_any():
+                metrics.inc("audio_proxy.bytes", len(chunk))
+                yield chunk
+        finally:
+            upstream.release()
+
+    @staticmethod
+    def build_response(upstream: aiohttp.ClientResponse, method: str) -> Response:
+        headers = {
+            name: upstream.headers[name]
+            for name in PASSTHROUGH_RESPONSE_HEADERS
+            if name in upstream.headers
+        }
+        headers.setdefault("accept-ranges", "bytes")
+
+        if method == "HEAD":
+            upstream.release()
+            return Response(status_code=upstream.status, headers=headers)
+
+        return StreamingResponse(
+            AudioProxy._relay(upstream),
+            status_code=upstream.status,
+            headers=headers,
+            background=BackgroundTask(upstream.release),
+        )
@@ -0,0 +1,162 @@
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+INTEGER_ZERO = "a0"
+SMALLEST_INTEGER = "A" + DIGITS[0] * 26
+
+
+def _midpoint(a: str, b: str | None) -> str:
+    zero = DIGITS[0]
+    if b is not None and a >= b:
+        raise ValueError(f"{a} >= {b}")
+    if a[-1:] == zero or (b and b[-1:] == zero):
+        raise ValueError("Trailing zero in fractional part")
+
+    if b:
+        n = 0
+        while (a[n] if n < len(a) else zero) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid order key head: {head}")
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid order key: {key}")
+    return key[:length]
+
+
+def _validate(key: str):
+    if key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid order key: {key}")
+    if key[len(_integer_part(key)):][-1:] == DIGITS[0]:
+        raise ValueError(f"Invalid order key: {key}")
+
+
+def _increment_integer(x: str) -> str | None:
+    head, digits = x[0], list(x[1:])
+    carry = True
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d == len(DIGITS):
+            digits[i] = DIGITS[0]
+        else:
+            digits[i] = DIGITS[d]
+            carry = False
+            break
+
+    if not carry:
+        return head + "".join(digits)
+    if head == "Z":
+        return INTEGER_ZERO
+    if head == "z":
+        return None
+
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement_integer(x: str) -> str | None:
+    head, digits = x[0], list(x[1:])
+    borrow = True
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d == -1:
+            digits[i] = DIGITS[-1]
+        else:
+            digits[i] = DIGITS[d]
+            borrow = False
+            break
+
+    if not borrow:
+        return head + "".join(digits)
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def key_between(a: str | None, b: str | None) -> str:
+    if a is not None:
+        _validate(a)
+    if b is not None:
+        _validate(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"{a} >= {b}")
+
+    if a is None:
+        if b is None:
+            return INTEGER_ZERO
+        int_b = _integer_part(b)
+        if int_b == SMALLEST_INTEGER:
+            return int_b + _midpoint("", b[len(int_b):])
+        if int_b < b:
+            return int_b
+        key = _decrement_integer(int_b)
+        if key is None:
+            raise ValueError("Cannot decrement any more")
+        return key
+
+    int_a = _integer_part(a)
+    if b is None:
+        key = _increment_integer(int_a)
+        return int_a + _midpoint(a[len(int_a):], None) if key is None else key
+
+    int_b = _integer_part(b)
+    if int_a == int_b:
+        return int_a + _midpoint(a[len(int_a):], b[len(int_b):])
+    key = _increment_integer(int_a)
+    if key is None:
+        raise ValueError("Cannot increment any more")
+    if key < b:
+        return key
+    return int_a + _midpoint(a[len(int_a):], None)
+
+
+def n_keys_between(a: str | None, b: str | None, n: int) -> list[str]:
+    if n == 0:
+        return []
+    if n == 1:
+        return [key_between(a, b)]
+
+    if b is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(keys[-1], b))
+        return keys
+
+    if a is None:
+        keys = [key_between(a, b)]
+        for _ in range(n - 1):
+            keys.append(key_between(a, keys[-1]))
+        return keys[::-1]
+
+    mid = n // 2
+    key = key_between(a, b)
+    return [*n_keys_between(a, key, mid), key, *n_keys_between(key, b, n - mid - 1)]
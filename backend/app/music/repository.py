@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 
 import aiohttp
 
-from core.exceptions import UpstreamServiceError, InvalidToken
+from core.exceptions import UpstreamServiceError, InvalidToken, UpstreamRateLimited, UpstreamUnavailable
 
 
 class MusicRepository(ABC):
@@ -14,30 +14,19 @@ class MusicRepository(ABC):
     async def stream_track(self, track_id: int) -> dict:
         pass
 
-    @abstractmethod
-    async def close(self):
-        pass
-
 
 class DabRepository(MusicRepository):
     def __init__(
             self,
             api_base_url: str,
             dab_session: str,
-            headers: dict,
+            session: aiohttp.ClientSession,
     ):
         self.api_base_url = api_base_url
         self.dab_session = dab_session
-        self.headers = headers
-        self._session: aiohttp.ClientSession | None = None
-
-    async def _ensure_session(self):
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(headers=self.headers)
+        self._session = session
 
     async def search_tracks(self, query: str, offset: int) -> list[dict]:
-        await self._ensure_session()
-
         url = f"{self.api_base_url}/search"
         params = {"q": query, "offset": offset}
         cookies = {"session": self.dab_session}
@@ -51,12 +40,18 @@ class DabRepository(MusicRepository):
                 if response.status == 401:
                     raise InvalidToken("DAB session expired")
 
+                if response.status == 429:
+                    raise UpstreamRateLimited("DAB rate limit exceeded")
+
+                if response.status >= 500:
+                    raise UpstreamUnavailable(f"DAB responded with {response.status}")
+
                 if response.status != 200:
                     return []
 
                 data = await response.json()
-        except aiohttp.ClientError as e:
-            raise UpstreamServiceError(f"Search failed: {str(e)}")
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise UpstreamUnavailable(f"Search failed: {str(e)}")
 
         return [
             {
@@ -73,8 +68,6 @@ class DabRepository(MusicRepository):
         ]
 
     async def stream_track(self, track_id: int) -> dict:
-        await self._ensure_session()
-
         url = f"{self.api_base_url}/stream"
         params = {"trackId": track_id}
         cookies = {"session": self.dab_session}
@@ -88,6 +81,12 @@ class DabRepository(MusicRepository):
                 if response.status == 401:
                     raise InvalidToken("DAB session expired")
 
+                if response.status == 429:
+                    raise UpstreamRateLimited("DAB rate limit exceeded")
+
+                if response.status >= 500:
+                    raise UpstreamUnavailable(f"DAB responded with {response.status}")
+
                 if response.status != 200:
                     text = await response.text()
                     raise UpstreamServiceError(
@@ -95,10 +94,5 @@ class DabRepository(MusicRepository):
                     )
 
                 return await response.json()
-        except aiohttp.ClientError as e:
-            raise UpstreamServiceError(f"Stream connection failed: {str(e)}")
-
-    async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise UpstreamUnavailable(f"Stream connection failed: {str(e)}")
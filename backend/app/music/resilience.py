@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from config import settings
+from core.exceptions import CircuitOpen, UpstreamRateLimited, UpstreamUnavailable
+from core.metrics import metrics
+from music.repository import MusicRepository
+
+T = TypeVar("T")
+
+STATE_CODES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_inflight = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str):
+        self._state = state
+        metrics.set_gauge(f"breaker.{self.name}.state", STATE_CODES[state])
+        if state == "open":
+            self._opened_at = time.monotonic()
+            metrics.inc(f"breaker.{self.name}.opened")
+
+    def _allow(self) -> bool:
+        if self._state == "open":
+            if time.monotonic() - self._opened_at < settings.DAB_BREAKER_OPEN_SECONDS:
+                return False
+            self._set_state("half_open")
+
+        if self._state == "half_open":
+            # пробный запрос один, остальные отклоняем до его результата
+            if self._trial_inflight:
+                return False
+            self._trial_inflight = True
+        return True
+
+    def _on_success(self):
+        self._failures = 0
+        self._trial_inflight = False
+        if self._state != "closed":
+            self._set_state("closed")
+
+    def _on_failure(self):
+        self._trial_inflight = False
+        self._failures += 1
+        if self._state == "half_open" or self._failures >= settings.DAB_BREAKER_FAILURE_THRESHOLD:
+            self._failures = 0
+            self._set_state("open")
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self._allow():
+            metrics.inc(f"breaker.{self.name}.rejected")
+            raise CircuitOpen(f"Upstream {self.name} is temporarily unavailable")
+
+        try:
+            async with asyncio.timeout(settings.DAB_REQUEST_TIMEOUT_SECONDS):
+                result = await fn()
+        except TimeoutError:
+            self._on_failure()
+            raise UpstreamUnavailable(f"Upstream {self.name} request timed out")
+        except (UpstreamUnavailable, UpstreamRateLimited):
+            self._on_failure()
+            raise
+        except BaseException:
+            # ошибки клиента (4xx, протухшая сессия) не говорят о здоровье DAB
+            self._trial_inflight = False
+            raise
+
+        self._on_success()
+        return result
+
+
+class LatencyTracker:
+    def __init__(self):
+        self._samples: deque[float] = deque(maxlen=settings.DAB_HEDGE_SAMPLE_SIZE)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < settings.DAB_HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class Hedger:
+    def __init__(self, name: str):
+        self.name = name
+        self._latency = LatencyTracker()
+        self._budget = 0.0
+
+    async def _timed(self, call: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await call()
+        self._latency.record(time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self) -> float | None:
+        if not settings.DAB_HEDGE_ENABLED:
+            return None
+
+        # каждый запрос пополняет бюджет на долю хеджа, чтобы при деградации не удваивать нагрузку
+        self._budget = min(settings.DAB_HEDGE_MAX_BURST, self._budget + settings.DAB_HEDGE_MAX_RATIO)
+        p95 = self._latency.percentile(0.95)
+        if p95 is None:
+            return None
+        return max(p95, settings.DAB_HEDGE_MIN_DELAY_SECONDS)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._timed(call)
+
+        attempts = [asyncio.ensure_future(self._timed(call))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or self._budget < 1:
+                return await attempts[0]
+
+            self._budget -= 1
+            metrics.inc(f"hedge.{self.name}.sent")
+            attempts.append(asyncio.ensure_future(self._timed(call)))
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is attempts[1]:
+                            metrics.inc(f"hedge.{self.name}.won")
+                        return attempt.result()
+            return await attempts[0]
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_hedgers: dict[str, Hedger] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def get_hedger(name: str) -> Hedger:
+    if name not in _hedgers:
+        _hedgers[name] = Hedger(name)
+    return _hedgers[name]
+
+
+class ResilientRepository(MusicRepository):
+    def __init__(self, repository: MusicRepository, provider: str = "dab"):
+        self._repository = repository
+        self._search_breaker = get_breaker(f"{provider}.search")
+        self._stream_breaker = get_breaker(f"{provider}.stream")
+        self._search_hedger = get_hedger(f"{provider}.search")
+        self._stream_hedger = get_hedger(f"{provider}.stream")
+
+    async def search_tracks(self, query: str, offset: int) -> list[dict]:
+        return await self._search_breaker.call(
+            lambda: self._search_hedger.run(lambda: self._repository.search_tracks(query, offset))
+        )
+
+    async def stream_track(self, track_id: int) -> dict:
+        return await self._stream_breaker.call(
+            lambda: self._stream_hedger.run(lambda: self._repository.stream_track(track_id))
+        )
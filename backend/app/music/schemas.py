@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
+
+SearchMode = Literal["upstream", "local"]
 
 
 class TrackBase(BaseModel):
@@ -26,3 +28,26 @@ class PlaylistResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PlaylistSummary(BaseModel):
+    id: int
+    name: str
+    cover_image: Optional[str] = None
+    track_count: int = 0
+    total_duration: int = 0
+
+
+class PlaylistSummaryPage(BaseModel):
+    items: List[PlaylistSummary] = []
+    next_cursor: Optional[int] = None
+
+
+class TrackMove(BaseModel):
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+
+class NowPlaying(BaseModel):
+    playlist_id: int
+    track_id: int
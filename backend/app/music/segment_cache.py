@@ -0,0 +1,489 @@
+import asyncio
+import base64
+import json
+import math
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import aiohttp
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from config import settings
+from core.exceptions import UpstreamServiceError
+from core.metrics import metrics
+from core.tasks import spawn
+
+RangeOpener = Callable[[int, int], Awaitable[aiohttp.ClientResponse]]
+
+INDEX_VERSION = 1
+INDEX_FILE_NAME = "index.json"
+SEND_CHUNK_BYTES = 256 * 1024
+
+
+class RangesUnsupported(Exception):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+@dataclass
+class _Entry:
+    size: int
+    content_type: str
+    etag: str | None
+    last_modified: str | None
+    segments: bytearray
+    last_access: float
+    hits: int = 0
+    cached_bytes: int = 0
+
+    def has(self, index: int) -> bool:
+        return bool(self.segments[index >> 3] & (1 << (index & 7)))
+
+    def mark(self, index: int):
+        self.segments[index >> 3] |= 1 << (index & 7)
+
+    def segment_count(self, segment_bytes: int) -> int:
+        return math.ceil(self.size / segment_bytes)
+
+    def score(self) -> float:
+        return self.last_access + settings.SEGMENT_CACHE_FREQUENCY_WEIGHT_SECONDS * math.log2(1 + self.hits)
+
+
+def _parse_content_range(value: str) -> int:
+    unit, _, spec = value.partition(" ")
+    _, _, total = spec.partition("/")
+    if unit != "bytes" or not total.isdigit():
+        raise UpstreamServiceError(f"Unexpected Content-Range: {value}")
+    return int(total)
+
+
+def _requested_start(range_header: str | None) -> int:
+    if range_header and range_header.startswith("bytes="):
+        start, _, _ = range_header[6:].partition("-")
+        if start.isdigit():
+            return int(start)
+    return 0
+
+
+def _parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+
+    start, _, end = range_header[6:].strip().partition("-")
+    if not start:
+        if not end.isdigit() or int(end) == 0:
+            raise RangeNotSatisfiable()
+        return max(size - int(end), 0), size - 1
+
+    if not start.isdigit() or (end and not end.isdigit()):
+        return None
+    # синтаксически неверный диапазон (RFC 9110, 14.1.1) игнорируем и отдаём 200
+    if end and int(end) < int(start):
+        return None
+    if int(start) >= size:
+        raise RangeNotSatisfiable()
+    return int(start), min(int(end), size - 1) if end else size - 1
+
+
+def _allocate(path: Path, size: int, reset: bool):
+    if reset:
+        path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _write_at(path: Path, data: bytes, offset: int):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+def _write_index(index_path: Path, snapshot: dict, dirty_paths: list[Path]):
+    for path in dirty_paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    tmp_path = index_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+
+
+class _SegmentResponse(Response):
+    def __init__(
+            self,
+            cache: "SegmentCache",
+            track_id: int,
+            byte_range: tuple[int, int],
+            open_range: RangeOpener,
+            status_code: int,
+            headers: dict,
+            method: str,
+    ):
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers)
+        self._cache = cache
+        self._track_id = track_id
+        self._byte_range = byte_range
+        self._open_range = open_range
+        self._method = method
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if self._method != "HEAD":
+            zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+            self._cache.pin(self._track_id)
+            try:
+                await self._cache.send_range(self._track_id, *self._byte_range, self._open_range, send, zerocopy)
+            except Exception as e:
+                # заголовки уже ушли: не завершаем тело, а пробрасываем ошибку, чтобы сервер оборвал соединение
+                # и клиент отличил недокачанный ответ от конца файла
+                metrics.inc("segment_cache.aborted")
+                print(f"Aborting cached audio response for track {self._track_id}: {e}")
+                raise
+            finally:
+                self._cache.unpin(self._track_id)
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class SegmentCache:
+    def __init__(self):
+        self._dir = Path(settings.SEGMENT_CACHE_DIR)
+        self._segment_bytes = settings.SEGMENT_CACHE_SEGMENT_BYTES
+        self._entries: dict[int, _Entry] = {}
+        self._fills: dict[tuple[int, int], asyncio.Task] = {}
+        self._pins: Counter[int] = Counter()
+        self._dirty: set[int] = set()
+        self._total_bytes = 0
+        self._flush_task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SEGMENT_CACHE_ENABLED
+
+    def _path(self, track_id: int) -> Path:
+        return self._dir / f"{track_id}.bin"
+
+    async def open(self):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._load_index)
+        self._flush_task = spawn(self._flush_periodically())
+
+    async def close(self):
+        if not self.enabled:
+            return
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self._flush()
+
+    def _load_index(self):
+        self._dir.mkdir(parents=True, exist_ok=True)
+        try:
+            data = json.loads((self._dir / INDEX_FILE_NAME).read_text())
+        except (FileNotFoundError, ValueError):
+            data = {}
+
+        tracks = {}
+        if data.get("version") == INDEX_VERSION and data.get("segment_bytes") == self._segment_bytes:
+            tracks = data.get("tracks", {})
+
+        for track_id, (size, content_type, etag, last_modified, segments, last_access, hits) in tracks.items():
+            path = self._path(int(track_id))
+            if not path.exists() or path.stat().st_size < size:
+                continue
+
+            entry = _Entry(size, content_type, etag, last_modified, bytearray(base64.b64decode(segments)), last_access, hits)
+            count = entry.segment_count(self._segment_bytes)
+            entry.cached_bytes = sum(
+                min(self._segment_bytes, size - index * self._segment_bytes)
+                for index in range(count)
+                if entry.has(index)
+            )
+            self._entries[int(track_id)] = entry
+            self._total_bytes += entry.cached_bytes
+
+        for path in self._dir.glob("*.bin"):
+            if not path.stem.isdigit() or int(path.stem) not in self._entries:
+                path.unlink(missing_ok=True)
+
+        metrics.set_gauge("segment_cache.bytes", self._total_bytes)
+
+    def _snapshot(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "segment_bytes": self._segment_bytes,
+            "tracks": {
+                str(track_id): [
+                    e.size,
+                    e.content_type,
+                    e.etag,
+                    e.last_modified,
+                    base64.b64encode(e.segments).decode(),
+                    e.last_access,
+                    e.hits,
+                ]
+                for track_id, e in self._entries.items()
+            },
+        }
+
+    async def _flush(self):
+        snapshot = self._snapshot()
+        dirty_paths = [self._path(track_id) for track_id in self._dirty]
+        self._dirty.clear()
+        await asyncio.to_thread(_write_index, self._dir / INDEX_FILE_NAME, snapshot, dirty_paths)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.SEGMENT_CACHE_INDEX_FLUSH_SECONDS)
+            try:
+                await self._flush()
+            except OSError as e:
+                print(f"Segment cache index flush failed: {e}")
+
+    def pin(self, track_id: int):
+        self._pins[track_id] += 1
+
+    def unpin(self, track_id: int):
+        self._pins[track_id] -= 1
+        if self._pins[track_id] <= 0:
+            del self._pins[track_id]
+
+    async def _create_entry(self, track_id: int, size: int, headers) -> _Entry:
+        previous = self._entries.pop(track_id, None)
+        if previous is not None:
+            self._total_bytes -= previous.cached_bytes
+
+        entry = _Entry(
+            size=size,
+            content_type=headers.get("content-type", "application/octet-stream"),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            segments=bytearray(math.ceil(size / self._segment_bytes / 8)),
+            last_access=time.time(),
+        )
+        self._entries[track_id] = entry
+        await asyncio.to_thread(_allocate, self._path(track_id), size, previous is not None)
+        return entry
+
+    async def _fill(self, track_id: int, index: int, open_range: RangeOpener):
+        self.pin(track_id)
+        try:
+            start = index * self._segment_bytes
+            end = start + self._segment_bytes - 1
+            entry = self._entries.get(track_id)
+            if entry is not None:
+                end = min(end, entry.size - 1)
+
+            upstream = await open_range(start, end)
+            try:
+                if upstream.status != 206:
+                    raise RangesUnsupported()
+                size = _parse_content_range(upstream.headers.get("content-range", ""))
+                data = await upstream.read()
+            finally:
+                upstream.release()
+
+            etag = upstream.headers.get("etag")
+            entry = self._entries.get(track_id)
+            if entry is None or entry.size != size or (entry.etag and etag and entry.etag != etag):
+                entry = await self._create_entry(track_id, size, upstream.headers)
+
+            if len(data) != min(self._segment_bytes, size - start):
+                raise UpstreamServiceError("Short audio segment from upstream")
+
+            await asyncio.to_thread(_write_at, self._path(track_id), data, start)
+            if self._entries.get(track_id) is not entry or entry.has(index):
+                return
+
+            entry.mark(index)
+            entry.cached_bytes += len(data)
+            self._total_bytes += len(data)
+            self._dirty.add(track_id)
+            metrics.inc("segment_cache.filled_bytes", len(data))
+        finally:
+            self.unpin(track_id)
+
+        await self._evict()
+
+    async def _evict(self):
+        while self._total_bytes > settings.SEGMENT_CACHE_MAX_BYTES:
+            candidates = [
+                (entry.score(), track_id)
+                for track_id, entry in self._entries.items()
+                if track_id not in self._pins
+            ]
+            if not candidates:
+                break
+
+            _, victim = min(candidates)
+            entry = self._entries.pop(victim)
+            self._total_bytes -= entry.cached_bytes
+            self._dirty.discard(victim)
+            await asyncio.to_thread(self._path(victim).unlink, missing_ok=True)
+            metrics.inc("segment_cache.evictions")
+
+        metrics.set_gauge("segment_cache.bytes", self._total_bytes)
+
+    def _start_fill(self, track_id: int, index: int, open_range: RangeOpener) -> asyncio.Task | None:
+        entry = self._entries.get(track_id)
+        if entry is not None and entry.has(index):
+            return None
+
+        key = (track_id, index)
+        task = self._fills.get(key)
+        if task is None:
+            metrics.inc("segment_cache.miss")
+            task = asyncio.create_task(self._fill(track_id, index, open_range))
+            self._fills[key] = task
+            task.add_done_callback(lambda t: self._fill_done(key, t))
+        else:
+            metrics.inc("segment_cache.fill_shared")
+        return task
+
+    def _fill_done(self, key: tuple[int, int], task: asyncio.Task):
+        if self._fills.get(key) is task:
+            del self._fills[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _ensure_segment(self, track_id: int, index: int, open_range: RangeOpener) -> _Entry:
+        task = self._start_fill(track_id, index, open_range)
+        if task is None:
+            metrics.inc("segment_cache.hit")
+        else:
+            await asyncio.shield(task)
+        return self._entries[track_id]
+
+    async def send_range(
+            self,
+            track_id: int,
+            start: int,
+            end: int,
+            open_range: RangeOpener,
+            send: Send,
+            zerocopy: bool,
+    ):
+        index = start // self._segment_bytes
+        entry = self._entries.get(track_id)
+        while start <= end:
+            if await self._ensure_segment(track_id, index, open_range) is not entry:
+                # файл у источника сменился посреди ответа: склеивать байты разных версий нельзя
+                raise UpstreamServiceError("Upstream audio changed while streaming")
+            segment_end = min(end, (index + 1) * self._segment_bytes - 1)
+            if end > segment_end:
+                self._start_fill(track_id, index + 1, open_range)
+
+            await self._send_from_disk(self._path(track_id), start, segment_end, send, zerocopy)
+            metrics.inc("segment_cache.bytes_served", segment_end - start + 1)
+            start = segment_end + 1
+            index += 1
+
+    @staticmethod
+    async def _send_from_disk(path: Path, start: int, end: int, send: Send, zerocopy: bool):
+        if zerocopy:
+            f = await asyncio.to_thread(open, path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": True,
+                })
+            finally:
+                f.close()
+            return
+
+        fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+        try:
+            for offset in range(start, end + 1, SEND_CHUNK_BYTES):
+                length = min(SEND_CHUNK_BYTES, end + 1 - offset)
+                chunk = await asyncio.to_thread(os.pread, fd, length, offset)
+                if len(chunk) != length:
+                    raise UpstreamServiceError("Cached audio segment is truncated")
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            os.close(fd)
+
+    async def serve(
+            self,
+            track_id: int,
+            request_headers,
+            method: str,
+            open_range: RangeOpener,
+    ) -> Response | None:
+        range_header = request_headers.get("range")
+        entry = self._entries.get(track_id)
+
+        if entry is None:
+            if method == "HEAD":
+                return None
+            self.pin(track_id)
+            try:
+                first_index = _requested_start(range_header) // self._segment_bytes
+                entry = await self._ensure_segment(track_id, first_index, open_range)
+            except RangesUnsupported:
+                return None
+            finally:
+                self.unpin(track_id)
+
+        entry.last_access = time.time()
+        entry.hits += 1
+
+        headers = {
+            "content-type": entry.content_type,
+            "accept-ranges": "bytes",
+        }
+        if entry.etag:
+            headers["etag"] = entry.etag
+        if entry.last_modified:
+            headers["last-modified"] = entry.last_modified
+
+        if_range = request_headers.get("if-range")
+        if if_range and (if_range.startswith("W/") or if_range not in (entry.etag, entry.last_modified)):
+            range_header = None
+
+        try:
+            byte_range = _parse_range(range_header, entry.size)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{entry.size}"
+            return Response(status_code=416, headers=headers)
+
+        status_code = 200
+        if byte_range is None:
+            byte_range = (0, entry.size - 1)
+        else:
+            status_code = 206
+            headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{entry.size}"
+        headers["content-length"] = str(byte_range[1] - byte_range[0] + 1)
+
+        return _SegmentResponse(self, track_id, byte_range, open_range, status_code, headers, method)
+
+
+segment_cache = SegmentCache()
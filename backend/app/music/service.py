@@ -1,129 +1,297 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
 import aiohttp
-from sqlalchemy import select
+from sqlalchemy import select, func, delete, update, or_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from config import settings, DAB_SESSION_TTL_SECONDS
+from config import settings
 from core.exceptions import InvalidToken, UpstreamServiceError
-from music.models import Playlist, Track
-from music.repository import DabRepository
+from core.metrics import metrics
+from core.tasks import spawn
+from database import AsyncSessionLocal
+from http_client import http_client
+from music.cache import SearchCache, StreamCache, LibraryVersion
+from music.limiter import LimitedRepository, get_limiter
+from music.models import Playlist, Track, PlaylistTrackAssociation
+from music.prefetch import stream_prefetcher
+from music.proxy import AudioProxy, EXPIRED_URL_STATUSES, get_stream_url
+from music.ranking import n_keys_between
+from music.repository import DabRepository, MusicRepository
+from music.resilience import ResilientRepository
 from music.schemas import TrackBase
-from redis_client import redis_client
+from music.session import dab_session_manager
+from music.singleflight import SingleFlight
+from music.suggest import SuggestIndex
 
+T = TypeVar("T")
 
-class DabSessionCache:
-    @staticmethod
-    def _get_cache_key(user_id: int) -> str:
-        return f"dab_session:{user_id}"
+SEARCH_TERM = re.compile(r"\w+")
 
-    @staticmethod
-    async def get_session(user_id: int) -> str | None:
-        cache_key = DabSessionCache._get_cache_key(user_id)
-        return await redis_client.get(cache_key)
-
-    @staticmethod
-    async def set_session(user_id: int, session: str):
-        cache_key = DabSessionCache._get_cache_key(user_id)
-        await redis_client.set(cache_key, session, ex=DAB_SESSION_TTL_SECONDS)
-
-    @staticmethod
-    async def invalidate(user_id: int):
-        cache_key = DabSessionCache._get_cache_key(user_id)
-        await redis_client.delete(cache_key)
-
-
-class DabAuthService:
-    @staticmethod
-    async def register(username: str, email: str, password: str):
-        url = f"{settings.DAB_API_URL}/auth/register"
-        user_data = {
-            "username": username,
-            "email": email,
-            "password": password
-        }
-        headers = {"User-Agent": settings.SECRET_USER_AGENT}
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                        url,
-                        json=user_data,
-                        headers=headers
-                ) as resp:
-                    if resp.status != 201:
-                        text = await resp.text()
-                        raise UpstreamServiceError(f"DAB registration failed: {text}")
-            except aiohttp.ClientError as e:
-                raise UpstreamServiceError(f"Connection to DAB failed: {str(e)}")
-
-    @staticmethod
-    async def login(email: str, password: str) -> str:
-        url = f"{settings.DAB_API_URL}/auth/login"
-        user_data = {"email": email, "password": password}
-        headers = {"User-Agent": settings.SECRET_USER_AGENT}
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                        url,
-                        json=user_data,
-                        headers=headers
-                ) as resp:
-                    if resp.status != 200:
-                        text = await resp.text()
-                        raise UpstreamServiceError(f"DAB login failed: {text}")
-
-                    session_cookie = resp.cookies.get("session")
-                    if not session_cookie:
-                        raise UpstreamServiceError("No session cookie from DAB API")
-
-                    return session_cookie.value
-            except aiohttp.ClientError as e:
-                raise UpstreamServiceError(f"Connection to DAB failed: {str(e)}")
+search_flight = SingleFlight("search")
+stream_flight = SingleFlight("stream")
 
 
 class MusicService:
     def __init__(self, user_id: int, db: AsyncSession):
         self.user_id = user_id
         self.db = db
-        self.repository: DabRepository | None = None
+        self.repository: MusicRepository | None = None
+        self.dab_session: str | None = None
 
-    async def _get_repository(self) -> DabRepository:
+    async def _get_repository(self) -> MusicRepository:
         if self.repository is None:
-            dab_session = await DabSessionCache.get_session(self.user_id)
-
-            if not dab_session:
-                raise InvalidToken("DAB session expired, please login again")
-
-            headers = {"User-Agent": settings.SECRET_USER_AGENT}
-
-            self.repository = DabRepository(
-                api_base_url=settings.DAB_API_URL,
-                dab_session=dab_session,
-                headers=headers,
+            self.dab_session = await dab_session_manager.get_session(self.user_id)
+            # предохранитель и хеджер внутри слота лимитера: ожидание в нашей очереди
+            # не должно считаться таймаутом DAB и попадать в выборку задержек
+            self.repository = LimitedRepository(
+                ResilientRepository(
+                    DabRepository(
+                        api_base_url=settings.DAB_API_URL,
+                        dab_session=self.dab_session,
+                        session=http_client.session,
+                    ),
+                    provider="dab",
+                ),
+                get_limiter("dab"),
             )
 
         return self.repository
 
-    async def search_tracks(self, query: str, offset: int = 0) -> list[dict]:
+    async def _call_upstream(self, call: Callable[[MusicRepository], Awaitable[T]]) -> T:
         repo = await self._get_repository()
-        return await repo.search_tracks(query, offset)
+        try:
+            return await call(repo)
+        except InvalidToken:
+            # DAB сбросил сессию раньше срока: перелогиниваемся один раз и повторяем запрос
+            self.repository = None
+            await dab_session_manager.relogin(self.user_id, expired_session=self.dab_session)
+            return await call(await self._get_repository())
+
+    async def search_tracks(self, query: str, offset: int = 0, mode: str | None = None) -> list[dict]:
+        normalized_query = SearchCache.normalize_query(query)
+        tracks = await self._search(normalized_query, offset, mode or settings.SEARCH_DEFAULT_MODE)
+
+        if tracks and offset == 0:
+            spawn(SuggestIndex.record([normalized_query]))
+        return tracks
+
+    async def _search(self, normalized_query: str, offset: int, mode: str) -> list[dict]:
+        # клиент листает через offset += len(results), поэтому режимы не смешиваем:
+        # у локального индекса и у DAB разные пространства смещений
+        if mode == "local":
+            metrics.inc("search.local.served")
+            return await self._search_local(normalized_query, offset)
+        return await self._search_upstream(normalized_query, offset)
+
+    async def _search_local(self, normalized_query: str, offset: int) -> list[dict]:
+        terms = SEARCH_TERM.findall(normalized_query)
+        if not terms:
+            return []
+
+        ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        result = await self.db.execute(
+            select(Track.source_id, Track.title, Track.artist, Track.album, Track.album_cover, Track.duration)
+            .where(or_(
+                Track.search_vector.bool_op("@@")(ts_query),
+                Track.search_text.bool_op("%>")(normalized_query)
+            ))
+            .order_by(
+                (func.ts_rank(Track.search_vector, ts_query)
+                 + func.word_similarity(normalized_query, Track.search_text)).desc(),
+                Track.id
+            )
+            .offset(offset)
+            .limit(settings.SEARCH_LOCAL_LIMIT)
+        )
+        return [
+            {
+                "id": int(row.source_id),
+                "title": row.title,
+                "artist": row.artist,
+                "album": row.album or "",
+                "album_cover": row.album_cover or "",
+                "release_date": "",
+                "genre": "",
+                "duration": row.duration,
+            }
+            for row in result
+        ]
+
+    async def _search_upstream(self, normalized_query: str, offset: int) -> list[dict]:
+        tracks, is_stale = await SearchCache.get(normalized_query, offset)
+        if tracks is not None:
+            if is_stale and await SearchCache.acquire_refresh(normalized_query, offset):
+                spawn(self._fetch_search(normalized_query, offset))
+            return tracks
+
+        return await self._fetch_search(normalized_query, offset)
+
+    async def stream_search(self, query: str, offset: int, pages: int) -> AsyncIterator[dict]:
+        normalized_query = SearchCache.normalize_query(query)
+        offsets = [offset + page * settings.SEARCH_PAGE_SIZE for page in range(pages)]
+        cached = await SearchCache.get_many(normalized_query, offsets)
+
+        # все недостающие страницы запрашиваем сразу; задачи переживут обрыв соединения и досохранят кэш
+        pending = {
+            spawn(self._fetch_search(normalized_query, page_offset)): page_offset
+            for page_offset in offsets if page_offset not in cached
+        }
+
+        for page_offset in offsets:
+            if page_offset not in cached:
+                continue
+            tracks, is_stale = cached[page_offset]
+            if is_stale and await SearchCache.acquire_refresh(normalized_query, page_offset):
+                spawn(self._fetch_search(normalized_query, page_offset))
+            yield {"offset": page_offset, "tracks": tracks}
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=pending.get):
+                page_offset = pending.pop(task)
+                if task.exception() is not None:
+                    yield {"offset": page_offset, "error": str(task.exception()) or "Search failed"}
+                    continue
+                if page_offset == offset and task.result():
+                    spawn(SuggestIndex.record([normalized_query]))
+                yield {"offset": page_offset, "tracks": task.result()}
+
+    async def _fetch_search(self, normalized_query: str, offset: int) -> list[dict]:
+        async def fetch() -> list[dict]:
+            tracks = await self._call_upstream(lambda repo: repo.search_tracks(normalized_query, offset))
+            if tracks:
+                await SearchCache.set(normalized_query, offset, tracks)
+            return tracks
+
+        return await search_flight.do(f"{offset}:{normalized_query}", fetch)
+
+    def _stream_cache_scope(self) -> int | None:
+        return self.user_id if settings.STREAM_CACHE_PER_ACCOUNT else None
 
     async def stream_track(self, track_id: int) -> dict:
-        repo = await self._get_repository()
-        return await repo.stream_track(track_id)
+        scope = self._stream_cache_scope()
+
+        stream = await StreamCache.get(track_id, scope)
+        if stream is not None:
+            return stream
+
+        async def fetch() -> dict:
+            resolved = await self._call_upstream(lambda repo: repo.stream_track(track_id))
+            await StreamCache.set(track_id, scope, resolved)
+            return resolved
+
+        return await stream_flight.do(f"{track_id}:{scope}", fetch)
+
+    async def invalidate_stream(self, track_id: int):
+        await StreamCache.invalidate(track_id, self._stream_cache_scope())
 
-    async def close(self):
-        if self.repository:
-            await self.repository.close()
+    async def _open_audio_url(self, track_id: int, request_headers: dict, method: str) -> aiohttp.ClientResponse:
+        url = get_stream_url(await self.stream_track(track_id))
+        if not url:
+            raise UpstreamServiceError("Stream response has no audio URL")
+        return await AudioProxy.open(url, request_headers, method)
+
+    async def open_audio(self, track_id: int, request_headers: dict, method: str) -> aiohttp.ClientResponse:
+        upstream = await self._open_audio_url(track_id, request_headers, method)
+
+        if upstream.status in EXPIRED_URL_STATUSES:
+            upstream.release()
+            await self.invalidate_stream(track_id)
+            upstream = await self._open_audio_url(track_id, request_headers, method)
+
+        if upstream.status >= 400 and upstream.status != 416:
+            upstream.release()
+            raise UpstreamServiceError(f"Audio fetch failed with {upstream.status}")
+
+        return upstream
+
+    async def open_audio_range(self, track_id: int, start: int, end: int) -> aiohttp.ClientResponse:
+        return await self.open_audio(track_id, {"range": f"bytes={start}-{end}"}, "GET")
+
+    async def prefetch_upcoming(self, playlist_id: int, track_id: int):
+        # вызывается фоновой задачей, которая переживает запрос, поэтому сессия БД своя
+        current_position = (
+            select(PlaylistTrackAssociation.position)
+            .join(Track, Track.id == PlaylistTrackAssociation.track_id)
+            .where(PlaylistTrackAssociation.playlist_id == playlist_id, Track.source_id == str(track_id))
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            # только следующие треки по индексу (playlist_id, position), без чтения всего плейлиста
+            result = await db.execute(
+                select(Track.source_id)
+                .join(PlaylistTrackAssociation, PlaylistTrackAssociation.track_id == Track.id)
+                .join(Playlist, Playlist.id == PlaylistTrackAssociation.playlist_id)
+                .where(
+                    Playlist.id == playlist_id,
+                    Playlist.user_id == self.user_id,
+                    PlaylistTrackAssociation.position > current_position,
+                )
+                .order_by(PlaylistTrackAssociation.position, PlaylistTrackAssociation.track_id)
+                .limit(settings.PREFETCH_TRACKS_AHEAD)
+            )
+            upcoming = [int(source_id) for source_id in result.scalars().all()]
+
+        cached = await StreamCache.get_many(upcoming, self._stream_cache_scope())
+        upcoming = [upcoming_id for upcoming_id in upcoming if upcoming_id not in cached]
+        stream_prefetcher.schedule(self.user_id, upcoming, self.stream_track)
+
+    async def get_library_version(self) -> int:
+        return await LibraryVersion.get(self.user_id)
 
     async def get_playlists(self):
         result = await self.db.execute(
-            select(Playlist).where(Playlist.user_id == self.user_id)
+            select(Playlist)
+            .options(selectinload(Playlist.tracks))
+            .where(Playlist.user_id == self.user_id)
         )
         return result.scalars().all()
 
+    async def get_playlist_summaries(self, limit: int, after: int | None = None) -> list[dict]:
+        query = (
+            select(
+                Playlist.id,
+                Playlist.name,
+                Playlist.cover_image,
+                func.count(Track.id).label("track_count"),
+                func.coalesce(func.sum(Track.duration), 0).label("total_duration"),
+            )
+            .outerjoin(PlaylistTrackAssociation, PlaylistTrackAssociation.playlist_id == Playlist.id)
+            .outerjoin(Track, Track.id == PlaylistTrackAssociation.track_id)
+            .where(Playlist.user_id == self.user_id)
+            .group_by(Playlist.id)
+            .order_by(Playlist.id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(Playlist.id > after)
+
+        result = await self.db.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    async def _get_owned_playlist(self, playlist_id: int, for_update: bool = False) -> Playlist | None:
+        query = select(Playlist).where(Playlist.id == playlist_id, Playlist.user_id == self.user_id)
+        if for_update:
+            # блокировка строки плейлиста сериализует запись позиций и перебалансировку
+            query = query.with_for_update()
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def get_playlist(self, playlist_id: int) -> Playlist | None:
+        result = await self.db.execute(
+            select(Playlist)
+            .options(selectinload(Playlist.tracks))
+            .where(Playlist.id == playlist_id, Playlist.user_id == self.user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
     async def create_playlist(self, name: str):
-        query = select(Playlist).where(
+        query = select(Playlist).options(selectinload(Playlist.tracks)).where(
             Playlist.user_id == self.user_id,
             Playlist.name == name
         )
@@ -133,54 +301,227 @@ class MusicService:
         if existing_playlist:
             return existing_playlist
 
-        new_playlist = Playlist(name=name, user_id=self.user_id)
+        new_playlist = Playlist(name=name, user_id=self.user_id, tracks=[])
         self.db.add(new_playlist)
         await self.db.commit()
-        await self.db.refresh(new_playlist)
+        await LibraryVersion.bump(self.user_id)
         return new_playlist
 
     async def delete_playlist(self, playlist_id: int):
-        playlist = await self.db.get(Playlist, playlist_id)
-        if playlist and playlist.user_id == self.user_id:
+        playlist = await self._get_owned_playlist(playlist_id)
+        if playlist:
             await self.db.delete(playlist)
             await self.db.commit()
+            await LibraryVersion.bump(self.user_id)
+
+    async def _position_bounds(
+            self,
+            playlist_id: int,
+            after_id: int | None,
+            before_id: int | None,
+            exclude_track_id: int | None = None,
+    ) -> tuple[str | None, str | None]:
+        def position_of(source_id: int):
+            return (
+                select(PlaylistTrackAssociation.position)
+                .join(Track, Track.id == PlaylistTrackAssociation.track_id)
+                .where(PlaylistTrackAssociation.playlist_id == playlist_id, Track.source_id == str(source_id))
+                .scalar_subquery()
+            )
 
-    async def add_track_to_playlist(self, playlist_id: int, track_data: TrackBase):
-        playlist = await self.db.get(Playlist, playlist_id)
-        if not playlist or playlist.user_id != self.user_id:
+        def other_than(source_id: int):
+            return PlaylistTrackAssociation.track_id != (
+                select(Track.id).where(Track.source_id == str(source_id)).scalar_subquery()
+            )
+
+        neighbours = select(PlaylistTrackAssociation.position).where(
+            PlaylistTrackAssociation.playlist_id == playlist_id
+        )
+        if exclude_track_id is not None:
+            neighbours = neighbours.where(PlaylistTrackAssociation.track_id != exclude_track_id)
+
+        # соседа ищем нестрого: ключ, равный ключу якоря, вернётся как граница,
+        # и _new_positions увидит lower >= upper
+        if after_id is not None:
+            after = position_of(after_id)
+            query = select(after, neighbours.where(PlaylistTrackAssociation.position >= after, other_than(after_id))
+                           .order_by(PlaylistTrackAssociation.position).limit(1).scalar_subquery())
+        elif before_id is not None:
+            before = position_of(before_id)
+            query = select(neighbours.where(PlaylistTrackAssociation.position <= before, other_than(before_id))
+                           .order_by(PlaylistTrackAssociation.position.desc()).limit(1).scalar_subquery(), before)
+        else:
+            query = select(
+                neighbours.order_by(PlaylistTrackAssociation.position.desc()).limit(1).scalar_subquery(),
+                None
+            )
+
+        lower, upper = (await self.db.execute(query)).one()
+        if (after_id is not None and lower is None) or (before_id is not None and upper is None):
+            raise ValueError("Anchor track is not in this playlist")
+        return lower, upper
+
+    async def _new_positions(
+            self,
+            playlist_id: int,
+            n: int,
+            after_id: int | None,
+            before_id: int | None,
+            exclude_track_id: int | None = None,
+    ) -> list[str]:
+        lower, upper = await self._position_bounds(playlist_id, after_id, before_id, exclude_track_id)
+        if lower is not None and upper is not None and lower >= upper:
+            # в той же транзакции, что держит блокировку плейлиста
+            await _rebalance_positions(self.db, playlist_id)
+            lower, upper = await self._position_bounds(playlist_id, after_id, before_id, exclude_track_id)
+
+        return n_keys_between(lower, upper, n)
+
+    @staticmethod
+    def _schedule_rebalance(playlist_id: int, positions: list[str]):
+        # только после commit: иначе перебалансировка не увидит новые ключи
+        if positions and max(len(p) for p in positions) > settings.PLAYLIST_POSITION_MAX_LENGTH:
+            spawn(rebalance_playlist_positions(playlist_id))
+
+    async def add_track_to_playlist(
+            self,
+            playlist_id: int,
+            track_data: TrackBase,
+            after_id: int | None = None,
+            before_id: int | None = None,
+    ):
+        return await self.add_tracks_to_playlist(playlist_id, [track_data], after_id, before_id)
+
+    async def add_tracks_to_playlist(
+            self,
+            playlist_id: int,
+            tracks_data: list[TrackBase],
+            after_id: int | None = None,
+            before_id: int | None = None,
+    ):
+        if not await self._get_owned_playlist(playlist_id, for_update=True):
             return None
 
-        result = await self.db.execute(select(Track).where(Track.source_id == str(track_data.id)))
-        track = result.scalar_one_or_none()
-
-        if not track:
-            track = Track(
-                source_id=str(track_data.id),
-                title=track_data.title,
-                artist=track_data.artist,
-                album=track_data.album,
-                album_cover=track_data.album_cover,
-                duration=track_data.duration
+        unique_tracks = {str(t.id): t for t in tracks_data}
+        if unique_tracks:
+            track_stmt = insert(Track).values([
+                {
+                    "source_id": source_id,
+                    "title": t.title,
+                    "artist": t.artist,
+                    "album": t.album,
+                    "album_cover": t.album_cover,
+                    "duration": t.duration,
+                }
+                for source_id, t in unique_tracks.items()
+            ])
+            # строки tracks общие для всех пользователей: существующие не перезаписываем,
+            # no-op update нужен только чтобы RETURNING вернул их id
+            track_stmt = track_stmt.on_conflict_do_update(
+                index_elements=[Track.source_id],
+                set_={"source_id": track_stmt.excluded.source_id}
+            ).returning(Track.id, Track.source_id)
+            track_ids = {
+                source_id: track_id
+                for track_id, source_id in (await self.db.execute(track_stmt)).tuples().all()
+            }
+            ordered_track_ids = [track_ids[source_id] for source_id in unique_tracks]
+            positions = await self._new_positions(playlist_id, len(ordered_track_ids), after_id, before_id)
+
+            await self.db.execute(
+                insert(PlaylistTrackAssociation)
+                .values([
+                    {"playlist_id": playlist_id, "track_id": track_id, "position": position}
+                    for track_id, position in zip(ordered_track_ids, positions)
+                ])
+                .on_conflict_do_nothing()
             )
-            self.db.add(track)
             await self.db.commit()
-            await self.db.refresh(track)
+            await LibraryVersion.bump(self.user_id)
+            self._schedule_rebalance(playlist_id, positions)
 
-        if track not in playlist.tracks:
-            playlist.tracks.append(track)
-            await self.db.commit()
-            await self.db.refresh(playlist)
+            spawn(SuggestIndex.record([
+                phrase for t in unique_tracks.values() for phrase in (t.title, t.artist)
+            ]))
 
-        return playlist
+        return await self.get_playlist(playlist_id)
 
     async def remove_track_from_playlist(self, playlist_id: int, track_source_id: str):
-        playlist = await self.db.get(Playlist, playlist_id)
-        if not playlist or playlist.user_id != self.user_id:
+        if not await self._get_owned_playlist(playlist_id):
             return None
 
-        track_to_remove = next((t for t in playlist.tracks if t.source_id == str(track_source_id)), None)
-        if track_to_remove:
-            playlist.tracks.remove(track_to_remove)
-            await self.db.commit()
+        await self.db.execute(
+            delete(PlaylistTrackAssociation).where(
+                PlaylistTrackAssociation.playlist_id == playlist_id,
+                PlaylistTrackAssociation.track_id == select(Track.id)
+                .where(Track.source_id == str(track_source_id))
+                .scalar_subquery()
+            )
+        )
+        await self.db.commit()
+        await LibraryVersion.bump(self.user_id)
 
-        return playlist
+        return await self.get_playlist(playlist_id)
+
+    async def move_track_in_playlist(
+            self,
+            playlist_id: int,
+            track_source_id: str,
+            after_id: int | None = None,
+            before_id: int | None = None,
+    ) -> bool:
+        if not await self._get_owned_playlist(playlist_id, for_update=True):
+            return False
+
+        track_id = (await self.db.execute(
+            select(Track.id).where(Track.source_id == str(track_source_id))
+        )).scalar_one_or_none()
+        if track_id is None:
+            return False
+
+        [position] = await self._new_positions(playlist_id, 1, after_id, before_id, exclude_track_id=track_id)
+
+        result = await self.db.execute(
+            update(PlaylistTrackAssociation)
+            .where(
+                PlaylistTrackAssociation.playlist_id == playlist_id,
+                PlaylistTrackAssociation.track_id == track_id
+            )
+            .values(position=position)
+        )
+        await self.db.commit()
+        await LibraryVersion.bump(self.user_id)
+        self._schedule_rebalance(playlist_id, [position])
+        return result.rowcount > 0
+
+
+async def _rebalance_positions(db: AsyncSession, playlist_id: int):
+    # та же блокировка, что у add/move: перебалансировка не пересекается с записью
+    if (await db.execute(
+        select(Playlist.id).where(Playlist.id == playlist_id).with_for_update()
+    )).scalar_one_or_none() is None:
+        return
+
+    result = await db.execute(
+        select(PlaylistTrackAssociation.track_id)
+        .where(PlaylistTrackAssociation.playlist_id == playlist_id)
+        .order_by(PlaylistTrackAssociation.position, PlaylistTrackAssociation.track_id)
+    )
+    track_ids = result.scalars().all()
+    if not track_ids:
+        return
+
+    positions = n_keys_between(None, None, len(track_ids))
+    await db.execute(
+        update(PlaylistTrackAssociation),
+        [
+            {"playlist_id": playlist_id, "track_id": track_id, "position": position}
+            for track_id, position in zip(track_ids, positions)
+        ]
+    )
+
+
+async def rebalance_playlist_positions(playlist_id: int):
+    async with AsyncSessionLocal() as db:
+        await _rebalance_positions(db, playlist_id)
+        await db.commit()
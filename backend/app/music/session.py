@@ -0,0 +1,284 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from config import settings, DAB_SESSION_TTL_SECONDS
+from core.encryption import decrypt_password
+from core.exceptions import InvalidToken, UpstreamServiceError, UpstreamRateLimited, UpstreamUnavailable
+from core.metrics import metrics
+from core.tasks import spawn
+from database import AsyncSessionLocal
+from http_client import http_client
+from music.limiter import dab_limiter
+from music.resilience import get_breaker
+from redis_client import redis_client, RELEASE_LOCK_SCRIPT
+from users.models import User
+from users.repository import UserRepository
+
+RENEW_SCHEDULE_KEY = "dab_session:renew_at"
+ACTIVITY_KEY = "dab_session:active"
+RENEWER_LOCK_KEY = "dab_session:renewer:lock"
+
+# пишем сессию, только если токен ограждения не старее последнего записанного
+FENCED_SET_SCRIPT = redis_client.register_script("""
+local written = tonumber(redis.call('GET', KEYS[2]) or '0')
+if tonumber(ARGV[2]) < written then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+""")
+
+# номер ограждения выдаётся только вместе с блокировкой, поэтому растёт в порядке её получения;
+# счётчик не опускается ниже последнего записанного номера, даже если его ключ истёк
+ACQUIRE_LOCK_SCRIPT = redis_client.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local fence = math.max(
+    tonumber(redis.call('GET', KEYS[2]) or '0'),
+    tonumber(redis.call('GET', KEYS[3]) or '0')
+) + 1
+redis.call('SET', KEYS[2], fence, 'EX', ARGV[2])
+redis.call('SET', KEYS[1], fence, 'PX', ARGV[1])
+return fence
+""")
+
+
+class DabSessionCache:
+    @staticmethod
+    def _get_cache_key(user_id: int) -> str:
+        return f"dab_session:{user_id}"
+
+    @staticmethod
+    async def get_session(user_id: int) -> str | None:
+        cache_key = DabSessionCache._get_cache_key(user_id)
+        return await redis_client.get(cache_key)
+
+    @staticmethod
+    async def set_session(user_id: int, session: str, fence: int | None = None) -> bool:
+        cache_key = DabSessionCache._get_cache_key(user_id)
+        if fence is None:
+            await redis_client.set(cache_key, session, ex=DAB_SESSION_TTL_SECONDS)
+        elif not await FENCED_SET_SCRIPT(
+                [cache_key, f"{cache_key}:fence:written"],
+                [session, fence, DAB_SESSION_TTL_SECONDS]
+        ):
+            return False
+
+        # разносим продления по времени, чтобы сессии, выданные разом, не истекали разом
+        renew_at = (
+            time.time()
+            + DAB_SESSION_TTL_SECONDS
+            - settings.DAB_SESSION_RENEW_BEFORE_SECONDS
+            - random.uniform(0, settings.DAB_SESSION_RENEW_JITTER_SECONDS)
+        )
+        await redis_client.zadd(RENEW_SCHEDULE_KEY, {str(user_id): renew_at})
+        return True
+
+    @staticmethod
+    async def invalidate(user_id: int):
+        cache_key = DabSessionCache._get_cache_key(user_id)
+        await redis_client.delete(cache_key)
+        await redis_client.zrem(RENEW_SCHEDULE_KEY, str(user_id))
+
+
+class DabAuthService:
+    @staticmethod
+    async def register(username: str, email: str, password: str):
+        # предохранитель внутри слота лимитера: ожидание в нашей очереди не считается таймаутом DAB
+        await dab_limiter.run(
+            "auth", lambda: get_breaker("dab.auth").call(lambda: DabAuthService._register(username, email, password))
+        )
+
+    @staticmethod
+    async def _register(username: str, email: str, password: str):
+        url = f"{settings.DAB_API_URL}/auth/register"
+        user_data = {
+            "username": username,
+            "email": email,
+            "password": password
+        }
+        try:
+            async with http_client.session.post(url, json=user_data) as resp:
+                if resp.status == 429:
+                    raise UpstreamRateLimited("DAB rate limit exceeded")
+                if resp.status >= 500:
+                    raise UpstreamUnavailable(f"DAB responded with {resp.status}")
+                if resp.status != 201:
+                    text = await resp.text()
+                    raise UpstreamServiceError(f"DAB registration failed: {text}")
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise UpstreamUnavailable(f"Connection to DAB failed: {str(e)}")
+
+    @staticmethod
+    async def login(email: str, password: str) -> str:
+        return await dab_limiter.run(
+            "auth", lambda: get_breaker("dab.auth").call(lambda: DabAuthService._login(email, password))
+        )
+
+    @staticmethod
+    async def _login(email: str, password: str) -> str:
+        url = f"{settings.DAB_API_URL}/auth/login"
+        user_data = {"email": email, "password": password}
+        try:
+            async with http_client.session.post(url, json=user_data) as resp:
+                if resp.status == 429:
+                    raise UpstreamRateLimited("DAB rate limit exceeded")
+                if resp.status >= 500:
+                    raise UpstreamUnavailable(f"DAB responded with {resp.status}")
+                if resp.status != 200:
+                    text = await resp.text()
+                    raise UpstreamServiceError(f"DAB login failed: {text}")
+
+                session_cookie = resp.cookies.get("session")
+                if not session_cookie:
+                    raise UpstreamServiceError("No session cookie from DAB API")
+
+                return session_cookie.value
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise UpstreamUnavailable(f"Connection to DAB failed: {str(e)}")
+
+
+class DabSessionManager:
+    def __init__(self):
+        self._touched: dict[int, float] = {}
+        self._pending: set[int] = set()
+        self._renewer: asyncio.Task | None = None
+        self._limit: asyncio.Semaphore | None = None
+
+    async def touch(self, user_id: int):
+        now = time.time()
+        if now - self._touched.get(user_id, 0) < settings.DAB_SESSION_TOUCH_INTERVAL_SECONDS:
+            return
+        if len(self._touched) > 10_000:
+            self._touched.clear()
+        self._touched[user_id] = now
+        await redis_client.zadd(ACTIVITY_KEY, {str(user_id): now})
+
+    async def get_session(self, user_id: int) -> str:
+        await self.touch(user_id)
+        dab_session = await DabSessionCache.get_session(user_id)
+        if dab_session:
+            return dab_session
+        return await self.relogin(user_id)
+
+    async def login(self, user: User, expired_session: str | None = None) -> str:
+        if expired_session is None:
+            expired_session = await DabSessionCache.get_session(user.id)
+
+        cache_key = DabSessionCache._get_cache_key(user.id)
+        lock_keys = [f"{cache_key}:lock", f"{cache_key}:fence", f"{cache_key}:fence:written"]
+        deadline = time.monotonic() + settings.DAB_LOGIN_WAIT_TIMEOUT_SECONDS
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            fence = await ACQUIRE_LOCK_SCRIPT(lock_keys, [settings.DAB_LOGIN_LOCK_TTL_MS, DAB_SESSION_TTL_SECONDS])
+            if fence:
+                try:
+                    return await self._login_fenced(user, fence)
+                finally:
+                    await RELEASE_LOCK_SCRIPT(lock_keys[:1], [str(fence)])
+
+            if not waited:
+                waited = True
+                metrics.inc("dab_login.waited")
+
+            # логин уже выполняет другой запрос, ждём записанную им сессию
+            await asyncio.sleep(settings.DAB_LOGIN_POLL_INTERVAL_MS / 1000)
+            dab_session = await DabSessionCache.get_session(user.id)
+            if dab_session and dab_session != expired_session:
+                metrics.inc("dab_login.wait_ms", int((time.monotonic() - started) * 1000))
+                return dab_session
+
+            if time.monotonic() >= deadline:
+                metrics.inc("dab_login.wait_timeout")
+                raise UpstreamServiceError("Timed out waiting for DAB login")
+
+    async def _login_fenced(self, user: User, fence: int) -> str:
+        dab_session = await DabAuthService.login(user.email, decrypt_password(user.ext_password_encrypted))
+        metrics.inc("dab_session.login")
+
+        if not await DabSessionCache.set_session(user.id, dab_session, fence=fence):
+            # пока мы логинились, блокировка истекла и более новый логин уже записал сессию
+            metrics.inc("dab_login.fence_rejected")
+            return await DabSessionCache.get_session(user.id) or dab_session
+        return dab_session
+
+    async def relogin(self, user_id: int, expired_session: str | None = None) -> str:
+        # сессию уже обновил параллельный запрос
+        dab_session = await DabSessionCache.get_session(user_id)
+        if dab_session and dab_session != expired_session:
+            return dab_session
+
+        async with AsyncSessionLocal() as db:
+            user = await UserRepository.get_by_id(db, user_id)
+
+        if not user or not user.is_active:
+            await DabSessionCache.invalidate(user_id)
+            raise InvalidToken("DAB session expired, please login again")
+
+        metrics.inc("dab_session.relogin")
+        return await self.login(user, expired_session=dab_session)
+
+    async def _renew(self, user_id: int, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            async with self._limit:
+                await self.relogin(user_id, await DabSessionCache.get_session(user_id))
+            metrics.inc("dab_session.renewed")
+        except Exception as e:
+            metrics.inc("dab_session.renew_failed")
+            print(f"DAB session renewal failed for user {user_id}: {e}")
+        finally:
+            self._pending.discard(user_id)
+
+    async def _schedule_renewals(self):
+        now = time.time()
+        await redis_client.zremrangebyscore(
+            ACTIVITY_KEY, 0, now - settings.DAB_SESSION_ACTIVE_WINDOW_SECONDS
+        )
+        due = await redis_client.zrangebyscore(
+            RENEW_SCHEDULE_KEY, 0, now, start=0, num=settings.DAB_SESSION_RENEW_BATCH_SIZE
+        )
+
+        for member in due:
+            user_id = int(member)
+            if user_id in self._pending:
+                continue
+
+            # неактивным пользователям сессию не продлеваем, при возвращении сработает relogin
+            if await redis_client.zscore(ACTIVITY_KEY, member) is None:
+                await redis_client.zrem(RENEW_SCHEDULE_KEY, member)
+                continue
+
+            self._pending.add(user_id)
+            spawn(self._renew(user_id, random.uniform(0, settings.DAB_SESSION_RENEW_INTERVAL_SECONDS)))
+
+    async def _run_renewer(self):
+        interval = settings.DAB_SESSION_RENEW_INTERVAL_SECONDS
+        while True:
+            try:
+                # один планировщик на кластер за интервал
+                if await redis_client.set(RENEWER_LOCK_KEY, "1", ex=interval, nx=True):
+                    await self._schedule_renewals()
+            except Exception as e:
+                print(f"DAB session renewal scheduling failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        self._limit = asyncio.Semaphore(settings.DAB_SESSION_RENEW_CONCURRENCY)
+        if settings.DAB_SESSION_RENEW_ENABLED:
+            self._renewer = spawn(self._run_renewer())
+
+    def stop(self):
+        if self._renewer:
+            self._renewer.cancel()
+            self._renewer = None
+
+
+dab_session_manager = DabSessionManager()
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from typing import Any, Awaitable, Callable
+
+from config import settings
+from core import exceptions
+from core.metrics import metrics
+from core.tasks import spawn
+from redis_client import redis_client, RELEASE_LOCK_SCRIPT
+
+CHANNEL_PREFIX = "singleflight:"
+# ведомым отдаём только данные и ошибки доступности DAB; остальное (InvalidToken,
+# ошибки логина) относится к сессии ведущего, и ведомый повторяет вызов сам
+SHARED_ERRORS = (exceptions.UpstreamRateLimited, exceptions.UpstreamUnavailable)
+
+
+class _ClusterResults:
+    def __init__(self):
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def _listen(self):
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    for waiter in self._waiters.pop(message["channel"], []):
+                        if not waiter.done():
+                            waiter.set_result(message["data"])
+        finally:
+            self._ready.clear()
+
+    async def register(self, channel: str) -> asyncio.Future:
+        if self._task is None or self._task.done():
+            self._task = spawn(self._listen())
+        await self._ready.wait()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(channel, []).append(waiter)
+        return waiter
+
+    def unregister(self, channel: str, waiter: asyncio.Future):
+        waiters = self._waiters.get(channel)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiters[channel]
+
+
+_cluster_results = _ClusterResults()
+
+
+def _encode_outcome(value: Any = None, error: Exception | None = None) -> str:
+    if error is None:
+        return json.dumps({"ok": True, "value": value})
+    if not isinstance(error, SHARED_ERRORS):
+        return json.dumps({"ok": False, "private": True})
+    name = type(error).__name__ if isinstance(error, exceptions.OasisException) else "UpstreamServiceError"
+    return json.dumps({"ok": False, "error": name, "detail": str(error)})
+
+
+def _decode_outcome(data: str) -> Any:
+    outcome = json.loads(data)
+    if outcome["ok"]:
+        return outcome["value"]
+    error_cls = getattr(exceptions, outcome["error"], exceptions.UpstreamServiceError)
+    raise error_cls(outcome["detail"])
+
+
+class SingleFlight:
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            metrics.inc(f"singleflight.{self.namespace}.leader")
+            task = asyncio.create_task(self._run(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            return await asyncio.shield(task)
+
+        metrics.inc(f"singleflight.{self.namespace}.shared")
+        try:
+            return await asyncio.shield(task)
+        except SHARED_ERRORS:
+            raise
+        except Exception:
+            metrics.inc(f"singleflight.{self.namespace}.private_retry")
+            return await fn()
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not settings.SINGLEFLIGHT_CLUSTER_ENABLED:
+            return await fn()
+
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        channel = f"{CHANNEL_PREFIX}{self.namespace}:{digest}"
+        lock_key = f"{channel}:lock"
+        result_key = f"{channel}:result"
+
+        token = uuid.uuid4().hex
+        if await redis_client.set(lock_key, token, px=settings.SINGLEFLIGHT_LOCK_TTL_MS, nx=True):
+            return await self._lead(fn, channel, lock_key, token, result_key)
+
+        return await self._follow(fn, channel, result_key)
+
+    async def _lead(self, fn, channel: str, lock_key: str, token: str, result_key: str) -> Any:
+        try:
+            try:
+                value = await fn()
+            except Exception as e:
+                await self._publish(channel, result_key, _encode_outcome(error=e))
+                raise
+            await self._publish(channel, result_key, _encode_outcome(value=value))
+            return value
+        finally:
+            await RELEASE_LOCK_SCRIPT([lock_key], [token])
+
+    @staticmethod
+    async def _publish(channel: str, result_key: str, outcome: str):
+        await redis_client.set(result_key, outcome, px=settings.SINGLEFLIGHT_LOCK_TTL_MS)
+        await redis_client.publish(channel, outcome)
+
+    async def _follow(self, fn, channel: str, result_key: str) -> Any:
+        waiter = None
+        try:
+            # подписка тоже под таймаутом: если слушатель не поднялся, идём в источник сами
+            async with asyncio.timeout(settings.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS):
+                waiter = await _cluster_results.register(channel)
+                data = await redis_client.get(result_key)
+                if data is None:
+                    data = await waiter
+        except TimeoutError:
+            metrics.inc(f"singleflight.{self.namespace}.cluster_timeout")
+            return await fn()
+        finally:
+            if waiter is not None:
+                _cluster_results.unregister(channel, waiter)
+
+        if json.loads(data).get("private"):
+            metrics.inc(f"singleflight.{self.namespace}.private_retry")
+            return await fn()
+
+        metrics.inc(f"singleflight.{self.namespace}.cluster_shared")
+        return _decode_outcome(data)
@@ -0,0 +1,88 @@
+import time
+
+from config import settings
+from core.metrics import metrics
+from music.cache import SearchCache
+from redis_client import redis_client
+
+# вес нового события растёт как 2^((t - epoch) / half_life), так что свежие события перевешивают старые
+# без пересчёта записанных очков. Чтобы вес не уходил в бесконечность, у каждого префикса своя эпоха:
+# когда она отстаёт больше чем на RESCALE_AFTER_HALF_LIVES, очки префикса сжимаются и эпоха сдвигается
+RESCALE_AFTER_HALF_LIVES = 32
+# эпоха префиксов, записанных до появления собственных эпох
+LEGACY_EPOCH = 1_700_000_000
+
+RECORD_SCRIPT = redis_client.register_script("""
+local now = tonumber(ARGV[2])
+local half_life = tonumber(ARGV[3])
+for i = 1, #KEYS, 2 do
+    local epoch = tonumber(redis.call('GET', KEYS[i + 1]) or '')
+    if not epoch then
+        epoch = redis.call('EXISTS', KEYS[i]) == 1 and tonumber(ARGV[7]) or now
+    end
+    local age = (now - epoch) / half_life
+    if age > tonumber(ARGV[6]) then
+        redis.call('ZUNIONSTORE', KEYS[i], 1, KEYS[i], 'WEIGHTS', 2 ^ -age)
+        epoch = now
+        age = 0
+    end
+    redis.call('ZINCRBY', KEYS[i], 2 ^ age, ARGV[1])
+    redis.call('ZREMRANGEBYRANK', KEYS[i], 0, -tonumber(ARGV[4]) - 1)
+    redis.call('EXPIRE', KEYS[i], ARGV[5])
+    redis.call('SET', KEYS[i + 1], epoch, 'EX', ARGV[5])
+end
+return 1
+""")
+
+
+class SuggestIndex:
+    @staticmethod
+    def _get_cache_key(prefix: str) -> str:
+        return f"suggest:{prefix}"
+
+    @staticmethod
+    def _prefixes(normalized: str) -> set[str]:
+        starts = [0] + [i + 1 for i, char in enumerate(normalized) if char == " "]
+        prefixes = set()
+        for start in starts:
+            tail = normalized[start:]
+            for length in range(1, min(len(tail), settings.SUGGEST_MAX_PREFIX_LENGTH) + 1):
+                prefixes.add(tail[:length])
+        return prefixes
+
+    @staticmethod
+    async def record(phrases: list[str]):
+        now = time.time()
+        for phrase in {SearchCache.normalize_query(phrase) for phrase in phrases}:
+            if not phrase or len(phrase) > settings.SUGGEST_MAX_PHRASE_LENGTH:
+                continue
+            keys = []
+            for prefix in SuggestIndex._prefixes(phrase):
+                keys += [SuggestIndex._get_cache_key(prefix), f"suggest_epoch:{prefix}"]
+            await RECORD_SCRIPT(keys, [
+                phrase,
+                now,
+                settings.SUGGEST_HALF_LIFE_SECONDS,
+                settings.SUGGEST_MAX_PER_PREFIX,
+                settings.SUGGEST_TTL_SECONDS,
+                RESCALE_AFTER_HALF_LIVES,
+                LEGACY_EPOCH,
+            ])
+
+    @staticmethod
+    async def suggest(query: str, limit: int) -> list[str]:
+        normalized = SearchCache.normalize_query(query)
+        if not normalized:
+            return []
+
+        metrics.inc("suggest.requests")
+        prefix = normalized[:settings.SUGGEST_MAX_PREFIX_LENGTH]
+        if prefix == normalized:
+            return await redis_client.zrevrange(SuggestIndex._get_cache_key(prefix), 0, limit - 1)
+
+        # префикс длиннее индексируемого: дофильтровываем кандидатов по полному вводу
+        candidates = await redis_client.zrevrange(SuggestIndex._get_cache_key(prefix), 0, -1)
+        return [
+            phrase for phrase in candidates
+            if phrase.startswith(normalized) or f" {normalized}" in phrase
+        ][:limit]
@@ -1,40 +1,316 @@
-from redis.asyncio import Redis
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline, PubSub
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import NoScriptError
+
 from config import settings
+from core.metrics import metrics
+from core.tasks import spawn
+
+INVALIDATION_CHANNEL = "__redis__:invalidate"
+
+
+class RedisScript:
+    def __init__(self, owner: "RedisClient", source: str):
+        self._owner = owner
+        self._source = source
+        self._sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, keys: list[str], args: list) -> Any:
+        client = self._owner.client
+        self._owner._invalidate_local(*keys)
+        try:
+            return await client.evalsha(self._sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await client.script_load(self._source)
+            return await client.evalsha(self._sha, len(keys), *keys, *args)
+
+
+class ClientSideCache:
+    def __init__(self, prefixes: list[str], max_keys: int, ttl_seconds: float):
+        self._prefixes = tuple(prefixes)
+        self._max_keys = max_keys
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, str | None]] = OrderedDict()
+        self._epoch = 0
+        self._ready = False
+        self._task: asyncio.Task | None = None
+
+    def tracks(self, key: str) -> bool:
+        return self._ready and key.startswith(self._prefixes)
+
+    def lookup(self, key: str) -> tuple[bool, str | None]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            metrics.inc("redis.client_cache.miss")
+            return False, None
+
+        self._entries.move_to_end(key)
+        metrics.inc("redis.client_cache.hit")
+        return True, entry[1]
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def store(self, key: str, value: str | None, epoch: int):
+        # пока шло чтение, пришла инвалидация: значение могло устареть
+        if epoch != self._epoch or not self.tracks(key):
+            return
+
+        self._entries[key] = (time.monotonic() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_keys:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keys: list[str] | None = None):
+        self._epoch += 1
+        if keys is None:
+            self._entries.clear()
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def _track(self):
+        # отдельное RESP2-соединение: сервер шлёт инвалидации по префиксам (BCAST) в __redis__:invalidate,
+        # ретраи отключены, чтобы после переподключения заново включить трекинг
+        client = Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            protocol=2,
+            socket_keepalive=True,
+            retry=Retry(NoBackoff(), 0),
+        )
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.connect()
+            connection = pubsub.connection
+            await connection.send_command("CLIENT", "ID")
+            client_id = await connection.read_response()
+
+            prefixes = [arg for prefix in self._prefixes for arg in ("PREFIX", prefix)]
+            await connection.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefixes)
+            await connection.read_response()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+            self.invalidate()
+            self._ready = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    metrics.inc("redis.client_cache.invalidation")
+                    self.invalidate(message["data"])
+        finally:
+            self._ready = False
+            self.invalidate()
+            await pubsub.aclose()
+            await client.aclose()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._track()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Redis client cache tracking lost: {e}")
+            await asyncio.sleep(1)
+
+    def start(self):
+        self._task = spawn(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._ready = False
+        self.invalidate()
 
 
 class RedisClient:
     def __init__(self):
         self._client: Redis | None = None
+        self._cache: ClientSideCache | None = None
 
     async def connect(self):
         try:
-            self._client = Redis.from_url(
+            pool = BlockingConnectionPool.from_url(
                 settings.REDIS_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
                 decode_responses=True,
                 encoding="utf-8"
             )
+            self._client = Redis.from_pool(pool)
             await self._client.ping()
         except Exception as e:
             raise Exception(f"Failed to connect to Redis: {e}")
 
+        if settings.REDIS_CLIENT_CACHE_ENABLED:
+            self._cache = ClientSideCache(
+                settings.REDIS_CLIENT_CACHE_PREFIXES,
+                settings.REDIS_CLIENT_CACHE_MAX_KEYS,
+                settings.REDIS_CLIENT_CACHE_TTL_SECONDS,
+            )
+            self._cache.start()
+
     async def disconnect(self):
+        if self._cache:
+            self._cache.stop()
+            self._cache = None
         if self._client:
             await self._client.aclose()
 
+    @property
+    def client(self) -> Redis:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return self._client
+
+    def _invalidate_local(self, *keys: str):
+        if self._cache:
+            self._cache.invalidate(list(keys))
+
     async def get(self, key: str) -> str | None:
+        return (await self.mget([key]))[0]
+
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        if not keys:
+            return []
+        if not self._cache:
+            return await self._client.mget(keys)
+
+        values: dict[str, str | None] = {}
+        missing = []
+        for key in keys:
+            if self._cache.tracks(key):
+                found, value = self._cache.lookup(key)
+                if found:
+                    values[key] = value
+                    continue
+            missing.append(key)
+
+        if missing:
+            epoch = self._cache.epoch
+            for key, value in zip(missing, await self._client.mget(missing)):
+                values[key] = value
+                self._cache.store(key, value, epoch)
+
+        return [values[key] for key in keys]
+
+    async def mset(self, mapping: dict[str, str], ex: int | None = None):
+        if not self._client:
+            raise Exception("Redis client not connected")
+        if not mapping:
+            return
+        self._invalidate_local(*mapping)
+
+        if ex is None:
+            await self._client.mset(mapping)
+            return
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            await pipe.execute()
+
+    def pipeline(self, transaction: bool = False) -> Pipeline:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return self._client.pipeline(transaction=transaction)
+
+    async def transaction(self, fn: Callable[[Pipeline], Awaitable[Any]], *watches: str) -> Any:
         if not self._client:
             raise Exception("Redis client not connected")
-        return await self._client.get(key)
+        return await self._client.transaction(fn, *watches, value_from_callable=True)
 
-    async def set(self, key: str, value: str, ex: int | None = None):
+    def register_script(self, script: str) -> RedisScript:
+        return RedisScript(self, script)
+
+    async def set(
+            self,
+            key: str,
+            value: str,
+            ex: int | None = None,
+            px: int | None = None,
+            nx: bool = False
+    ) -> bool:
         if not self._client:
             raise Exception("Redis client not connected")
-        await self._client.set(key, value, ex=ex)
+        self._invalidate_local(key)
+        return bool(await self._client.set(key, value, ex=ex, px=px, nx=nx))
 
     async def delete(self, key: str):
         if not self._client:
             raise Exception("Redis client not connected")
+        self._invalidate_local(key)
         await self._client.delete(key)
 
+    async def zadd(self, key: str, mapping: dict[str, float]):
+        if not self._client:
+            raise Exception("Redis client not connected")
+        await self._client.zadd(key, mapping)
+
+    async def zscore(self, key: str, member: str) -> float | None:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return await self._client.zscore(key, member)
+
+    async def zrangebyscore(
+            self,
+            key: str,
+            min_score: float,
+            max_score: float,
+            start: int | None = None,
+            num: int | None = None
+    ) -> list[str]:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return await self._client.zrangebyscore(key, min_score, max_score, start=start, num=num)
+
+    async def zrevrange(self, key: str, start: int, end: int) -> list[str]:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return await self._client.zrevrange(key, start, end)
+
+    async def zrem(self, key: str, *members: str):
+        if not self._client:
+            raise Exception("Redis client not connected")
+        await self._client.zrem(key, *members)
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float):
+        if not self._client:
+            raise Exception("Redis client not connected")
+        await self._client.zremrangebyscore(key, min_score, max_score)
+
+    async def publish(self, channel: str, message: str):
+        if not self._client:
+            raise Exception("Redis client not connected")
+        await self._client.publish(channel, message)
+
+    def pubsub(self) -> PubSub:
+        if not self._client:
+            raise Exception("Redis client not connected")
+        return self._client.pubsub(ignore_subscribe_messages=True)
+
 
 redis_client = RedisClient()
+
+# снимаем блокировку, только если она всё ещё наша
+RELEASE_LOCK_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
@@ -1,6 +1,6 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, BackgroundTasks, status
+from fastapi import APIRouter, Depends, status
 
 from core.dependencies import get_current_user_id
 from users.dependencies import get_user_service, get_current_user
@@ -14,15 +14,13 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
 async def register(
-        background_tasks: BackgroundTasks,
         user_data: UserRegister,
         service: Annotated[UserService, Depends(get_user_service)]
 ):
     return await service.register(
         user_data.username,
         user_data.email,
-        user_data.password,
-        background_tasks
+        user_data.password
     )
 
 
@@ -62,11 +60,10 @@ async def read_users_me(
 
 @router.post("/verify/request")
 async def request_verification_code(
-        background_tasks: BackgroundTasks,
         current_user: Annotated[User, Depends(get_current_user)],
         service: Annotated[UserService, Depends(get_user_service)]
 ):
-    return await service.request_verification(current_user.id, background_tasks)
+    return await service.request_verification(current_user.id)
 
 
 @router.post("/verify/confirm")
@@ -81,10 +78,9 @@ async def confirm_email(
 @router.post("/forgot-password")
 async def forgot_password(
         data: ForgotPasswordRequest,
-        background_tasks: BackgroundTasks,
         service: Annotated[UserService, Depends(get_user_service)]
 ):
-    return await service.forgot_password(data.email, background_tasks)
+    return await service.forgot_password(data.email)
 
 
 @router.post("/reset-password")
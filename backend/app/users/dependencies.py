@@ -1,14 +1,23 @@
+from dataclasses import dataclass
 from typing import Annotated
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.dependencies import get_current_user_id
-from core.exceptions import UserNotFound, InvalidCredentials
+from core.dependencies import get_token_payload
+from core.exceptions import UserNotFound, InvalidCredentials, InvalidToken
 from database import get_db
 from users.models import User
 from users.repository import UserRepository
 from users.service import UserService
+from users.state import user_state_cache
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    is_active: bool
+    is_verified: bool
 
 
 async def get_user_service(
@@ -17,12 +26,32 @@ async def get_user_service(
     return UserService(db)
 
 
+async def get_current_principal(
+        payload: Annotated[dict, Depends(get_token_payload)]
+) -> Principal:
+    user_id = int(payload["sub"])
+    is_active = payload.get("active", True)
+    is_verified = payload.get("verified", False)
+
+    state = await user_state_cache.get(user_id)
+    if state:
+        if payload.get("iat", 0) < state["not_before"]:
+            raise InvalidToken("Token has been revoked")
+        is_active = state["active"]
+        is_verified = state["verified"]
+
+    if not is_active:
+        raise InvalidCredentials("User is inactive")
+
+    return Principal(id=user_id, is_active=is_active, is_verified=is_verified)
+
+
 async def get_current_user(
-        user_id: Annotated[int, Depends(get_current_user_id)],
+        principal: Annotated[Principal, Depends(get_current_principal)],
         db: Annotated[AsyncSession, Depends(get_db)]
 ) -> User:
     repository = UserRepository()
-    user = await repository.get_by_id(db, user_id)
+    user = await repository.get_by_id(db, principal.id)
     if not user:
         raise UserNotFound()
     if not user.is_active:
@@ -1,7 +1,6 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.security import hash_password
 from users.models import User
 
 
@@ -11,10 +10,9 @@ class UserRepository:
             db: AsyncSession,
             username: str,
             email: str,
-            password: str,
+            hashed_password: str,
             ext_password_encrypted: str,
     ) -> User:
-        hashed_password = hash_password(password)
         user = User(
             username=username,
             email=email,
@@ -2,22 +2,23 @@ import random
 import uuid
 from datetime import timedelta
 
-from fastapi import BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
-from core.email import send_email
-from core.encryption import encrypt_password, decrypt_password
+from core.email import email_transport
+from core.encryption import encrypt_password
 from core.exceptions import (
     InvalidCredentials,
     InvalidToken, UpstreamServiceError
 )
-from core.security import verify_password, create_token, decode_token, hash_password
-from music.service import DabAuthService, DabSessionCache
+from core.crypto import crypto_service
+from core.security import create_token, decode_token
+from music.session import DabAuthService, DabSessionCache, dab_session_manager
 from redis_client import redis_client
 from users.models import User
 from users.repository import UserRepository
 from users.schemas import TokenResponse
+from users.state import user_state_cache
 
 
 class UserService:
@@ -25,8 +26,7 @@ class UserService:
         self.db = db
         self.repository = UserRepository()
 
-    async def register(self, username: str, email: str, password: str,
-                       background_tasks: BackgroundTasks) -> TokenResponse:
+    async def register(self, username: str, email: str, password: str) -> TokenResponse:
         dab_password = str(uuid.uuid4()) + str(uuid.uuid4())
 
         await DabAuthService.register(username, email, dab_password)
@@ -37,32 +37,28 @@ class UserService:
             self.db,
             username,
             email,
-            password,
+            await crypto_service.hash_password(password),
             ext_password_encrypted=encrypted_ext_pass
         )
 
         dab_session = await DabAuthService.login(email, dab_password)
         await DabSessionCache.set_session(user.id, dab_session)
 
-        await self._send_verification_code(user, background_tasks)
-        return self._generate_tokens(user.id)
+        await self._send_verification_code(user)
+        return self._generate_tokens(user)
 
     async def login(self, email: str, password: str) -> TokenResponse:
         user = await self.repository.get_by_email(self.db, email)
 
-        if not user or not verify_password(password, user.hashed_password):
+        if not user or not await crypto_service.verify_password(password, user.hashed_password):
             raise InvalidCredentials()
 
         if not user.is_active:
             raise InvalidCredentials("User is inactive")
 
-        ext_password_to_use = decrypt_password(user.ext_password_encrypted)
+        await dab_session_manager.login(user)
 
-        dab_session = await DabAuthService.login(email, ext_password_to_use)
-
-        await DabSessionCache.set_session(user.id, dab_session)
-
-        return self._generate_tokens(user.id)
+        return self._generate_tokens(user)
 
     async def refresh_tokens(self, refresh_token: str) -> TokenResponse:
         payload = decode_token(refresh_token)
@@ -73,6 +69,10 @@ class UserService:
         if not user_id:
             raise InvalidToken("Invalid token payload")
 
+        state = await user_state_cache.get(user_id)
+        if state and payload.get("iat", 0) < state["not_before"]:
+            raise InvalidToken("Token has been revoked")
+
         user = await self.repository.get_by_id(self.db, user_id)
         if not user:
             raise InvalidToken("User not found")
@@ -83,29 +83,20 @@ class UserService:
         dab_session = await DabSessionCache.get_session(user_id)
 
         if not dab_session:
-            ext_password_to_use = decrypt_password(user.ext_password_encrypted)
-
             try:
-                new_dab_session = await DabAuthService.login(user.email, ext_password_to_use)
-                await DabSessionCache.set_session(user_id, new_dab_session)
+                await dab_session_manager.login(user)
             except Exception as e:
                 raise UpstreamServiceError(f"Failed to refresh session: {str(e)}")
 
-        access_token = create_token(
-            data={"sub": str(user_id)},
-            expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
-            token_type="access"
-        )
-
         return TokenResponse(
-            access_token=access_token,
+            access_token=self._create_access_token(user),
             refresh_token=None
         )
 
     async def logout(self, user_id: int):
         await DabSessionCache.invalidate(user_id)
 
-    async def request_verification(self, user_id: int, background_tasks: BackgroundTasks):
+    async def request_verification(self, user_id: int):
         user = await self.repository.get_by_id(self.db, user_id)
         if not user:
             raise InvalidToken("User not found")
@@ -113,18 +104,18 @@ class UserService:
         if user.is_verified:
             raise UpstreamServiceError("User already verified")
 
-        await self._send_verification_code(user, background_tasks)
+        await self._send_verification_code(user)
 
         return {"message": "Verification code sent"}
 
-    async def _send_verification_code(self, user: User, background_tasks: BackgroundTasks):
+    async def _send_verification_code(self, user: User):
         code = "".join([str(random.randint(0, 9)) for _ in range(6)])
         await redis_client.set(f"verification:{user.id}", code, ex=600)
 
         subject = "Oasis App Verification Code"
         body = f"Hello {user.username},\n\nYour verification code is: {code}\n\nThis code expires in 10 minutes."
 
-        background_tasks.add_task(send_email, user.email, subject, body)
+        email_transport.enqueue(user.email, subject, body)
 
     async def verify_email(self, user_id: int, code: str):
         cached_code = await redis_client.get(f"verification:{user_id}")
@@ -142,10 +133,11 @@ class UserService:
         await self.db.refresh(user)
 
         await redis_client.delete(f"verification:{user_id}")
+        await user_state_cache.publish(user.id, user.is_active, user.is_verified)
 
         return {"message": "Email verified successfully"}
 
-    async def forgot_password(self, email: str, background_tasks: BackgroundTasks):
+    async def forgot_password(self, email: str):
         user = await self.repository.get_by_email(self.db, email)
         if not user:
             raise InvalidCredentials("User with this email does not exist")
@@ -157,7 +149,7 @@ class UserService:
         subject = "Reset Your Password"
         body = f"Hello {user.username},\n\nYour password reset code is: {code}\n\nIf you did not request this, please ignore this email."
 
-        background_tasks.add_task(send_email, email, subject, body)
+        email_transport.enqueue(email, subject, body)
 
         return {"message": "Reset code sent"}
 
@@ -174,25 +166,30 @@ class UserService:
         if not user:
             raise InvalidCredentials("User not found")
 
-        user.hashed_password = hash_password(new_password)
+        user.hashed_password = await crypto_service.hash_password(new_password)
 
         await self.db.commit()
 
         await redis_client.delete(f"reset:{email}")
 
         await DabSessionCache.invalidate(user.id)
+        await user_state_cache.publish(user.id, user.is_active, user.is_verified, revoke_tokens=True)
 
         return {"message": "Password updated successfully"}
 
-    def _generate_tokens(self, user_id: int) -> TokenResponse:
-        access_token = create_token(
-            data={"sub": str(user_id)},
+    @staticmethod
+    def _create_access_token(user: User) -> str:
+        return create_token(
+            data={"sub": str(user.id), "active": user.is_active, "verified": user.is_verified},
             expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
             token_type="access"
         )
 
+    def _generate_tokens(self, user: User) -> TokenResponse:
+        access_token = self._create_access_token(user)
+
         refresh_token = create_token(
-            data={"sub": str(user_id)},
+            data={"sub": str(user.id)},
             expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
             token_type="refresh"
         )
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from config import settings
+from core.tasks import spawn
+from redis_client import redis_client
+
+INVALIDATION_CHANNEL = "user_state:invalidate"
+
+
+class UserStateCache:
+    def __init__(self):
+        self._local: OrderedDict[int, tuple[float, dict | None]] = OrderedDict()
+        self._listener: asyncio.Task | None = None
+
+    @staticmethod
+    def _get_cache_key(user_id: int) -> str:
+        return f"user_state:{user_id}"
+
+    async def get(self, user_id: int) -> dict | None:
+        cached = self._local.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            self._local.move_to_end(user_id)
+            return cached[1]
+
+        raw = await redis_client.get(self._get_cache_key(user_id))
+        state = json.loads(raw) if raw else None
+        self._local[user_id] = (time.monotonic() + settings.USER_STATE_CACHE_TTL_SECONDS, state)
+        self._local.move_to_end(user_id)
+        while len(self._local) > settings.USER_STATE_CACHE_MAX_ENTRIES:
+            self._local.popitem(last=False)
+        return state
+
+    async def publish(self, user_id: int, is_active: bool, is_verified: bool, revoke_tokens: bool = False):
+        previous = await self.get(user_id)
+        # iat в JWT целый: токен, выпущенный в ту же секунду, что и сброс, тоже отзываем
+        not_before = int(time.time()) + 1 if revoke_tokens else (previous or {}).get("not_before", 0)
+        state = {"active": is_active, "verified": is_verified, "not_before": not_before}
+
+        await redis_client.set(
+            self._get_cache_key(user_id),
+            json.dumps(state),
+            ex=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+        )
+        self._local.pop(user_id, None)
+        await redis_client.publish(INVALIDATION_CHANNEL, str(user_id))
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # пока подписки не было, инвалидации могли потеряться
+                    self._local.clear()
+                    backoff = 1.0
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._local.pop(int(message["data"]), None)
+            except Exception as e:
+                print(f"User state invalidation listener failed: {e}")
+
+            self._local.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, settings.USER_STATE_LISTENER_MAX_BACKOFF_SECONDS)
+
+    def start(self):
+        self._listener = spawn(self._listen())
+
+    def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        self._local.clear()
+
+
+user_state_cache = UserStateCache()
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+import httpx
+from fastapi import FastAPI
+
+from music.encoding import MsgspecResponse, playlist_out
+from music.schemas import PlaylistResponse, TrackBase
+
+TRACKS = 5000
+ROUNDS = 50
+
+
+def _make_playlist():
+    tracks = [
+        SimpleNamespace(
+            source_id=str(100000 + i),
+            title=f"Track {i}",
+            artist=f"Artist {i % 300}",
+            album=f"Album {i % 700}",
+            album_cover=f"https://cdn.example.com/covers/{i % 700}.jpg",
+            duration=180 + i % 120
+        ) for i in range(TRACKS)
+    ]
+    return SimpleNamespace(id=1, name="Bench", cover_image=None, tracks=tracks)
+
+
+playlist = _make_playlist()
+app = FastAPI()
+
+
+# прежний путь: pydantic-модели собираются вручную, затем FastAPI валидирует и сериализует их по response_model
+@app.get("/before", response_model=PlaylistResponse)
+async def before():
+    tracks = [
+        TrackBase(
+            id=int(t.source_id),
+            title=t.title,
+            artist=t.artist,
+            album=t.album,
+            album_cover=t.album_cover,
+            duration=t.duration
+        ) for t in playlist.tracks
+    ]
+    return PlaylistResponse(id=playlist.id, name=playlist.name, cover_image=playlist.cover_image, tracks=tracks)
+
+
+@app.get("/after", response_model=PlaylistResponse)
+async def after():
+    return MsgspecResponse(playlist_out(playlist))
+
+
+async def _bench(client: httpx.AsyncClient, path: str) -> tuple[float, int]:
+    await client.get(path)
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        response = await client.get(path)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, len(response.content)
+
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        before_body = (await client.get("/before")).json()
+        after_body = (await client.get("/after")).json()
+        assert before_body == after_body, "Responses differ"
+
+        for path in ("/before", "/after"):
+            median_ms, size = await _bench(client, path)
+            print(f"{path:<8} {TRACKS} tracks: median {median_ms:.2f} ms, {size} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())